@@ -0,0 +1,240 @@
+from rgkit.gamestate import GameState
+from rgkit.settings import AttrDict
+
+
+# {board_size: (cell index -> loc)}
+_cell_locs = {}
+
+
+def cell_locs(board_size):
+    if board_size not in _cell_locs:
+        _cell_locs[board_size] = tuple((x, y)
+                                       for y in xrange(board_size)
+                                       for x in xrange(board_size))
+    return _cell_locs[board_size]
+
+
+class RobotsView(object):
+    '''
+    Dict-like view of the robots of an ArrayGameState, keyed by location.
+
+    Robots are handed out as AttrDicts built on first access, so bots and
+    older callers can keep using robots[loc].hp and friends. Writing through
+    the view is not supported apart from deleting robots.
+    '''
+
+    def __init__(self, state):
+        self._state = state
+        self._cache = {}
+        self._complete = False
+
+    def __len__(self):
+        return self._state._count
+
+    def __contains__(self, loc):
+        return self._state.is_robot(loc)
+
+    def __getitem__(self, loc):
+        if loc in self._cache:
+            return self._cache[loc]
+
+        state = self._state
+        i = state._index(loc)
+        if i is None or state._player_id[i] < 0:
+            raise KeyError(loc)
+        robot = self._cache[loc] = AttrDict({
+            'location': loc,
+            'hp': state._hp[i],
+            'player_id': state._player_id[i],
+            'robot_id': state._robot_id[i]
+        })
+        return robot
+
+    def __delitem__(self, loc):
+        if loc not in self:
+            raise KeyError(loc)
+        self._state.remove_robot(loc)
+
+    def _invalidate(self, loc):
+        self._cache.pop(loc, None)
+        self._complete = False
+
+    def __iter__(self):
+        return self.iterkeys()
+
+    def get(self, loc, default=None):
+        if loc in self:
+            return self[loc]
+        return default
+
+    def _robots(self):
+        if not self._complete:
+            for loc, hp, player_id, robot_id in self._state._iter_robots():
+                if loc not in self._cache:
+                    self._cache[loc] = AttrDict({
+                        'location': loc,
+                        'hp': hp,
+                        'player_id': player_id,
+                        'robot_id': robot_id
+                    })
+            self._complete = True
+        return self._cache
+
+    def iterkeys(self):
+        return self._robots().iterkeys()
+
+    def itervalues(self):
+        return self._robots().itervalues()
+
+    def iteritems(self):
+        return self._robots().iteritems()
+
+    def keys(self):
+        return list(self.iterkeys())
+
+    def values(self):
+        return list(self.itervalues())
+
+    def items(self):
+        return list(self.iteritems())
+
+
+class ArrayGameState(GameState):
+    '''
+    GameState that keeps the board in flat per-cell arrays of length
+    board_size ** 2 instead of a dict of AttrDicts.
+
+    A player_id of -1 marks an empty cell. The rules are shared with
+    GameState; only storage, apply_delta and scoring are specialised.
+    '''
+
+    def __init__(self, settings, use_start=False,
+                 turn=0, next_robot_id=0, seed=None):
+        self._size = settings.board_size
+        cells = self._size ** 2
+        self._locs = cell_locs(self._size)
+        self._hp = [0] * cells
+        self._player_id = [-1] * cells
+        self._robot_id = [-1] * cells
+        self._count = 0
+        self._occupied = None  # sorted occupied cells, built on demand
+
+        super(ArrayGameState, self).__init__(
+            settings, turn=turn, next_robot_id=next_robot_id, seed=seed)
+
+        # replace the dict set up by GameState, it is never written to
+        self.robots = RobotsView(self)
+
+        if use_start:
+            self._add_start_robots()
+
+    def _index(self, loc):
+        x, y = loc
+        if 0 <= x < self._size and 0 <= y < self._size:
+            return x + y * self._size
+        return None
+
+    def add_robot(self, loc, player_id, hp=None, robot_id=None):
+        if hp is None:
+            hp = self._settings.robot_hp
+
+        if robot_id is None:
+            robot_id = self._next_robot_id
+            self._next_robot_id += 1
+
+        i = self._index(loc)
+        if self._player_id[i] < 0:
+            self._count += 1
+            self._occupied = None
+        self.robots._invalidate(loc)
+        self._hp[i] = hp
+        self._player_id[i] = player_id
+        self._robot_id[i] = robot_id
+
+    def remove_robot(self, loc):
+        if self.is_robot(loc):
+            i = self._index(loc)
+            self._hp[i] = 0
+            self._player_id[i] = -1
+            self._robot_id[i] = -1
+            self._count -= 1
+            self._occupied = None
+            self.robots._invalidate(loc)
+
+    def _lift(self, loc):
+        i = self._index(loc)
+        robot = (self._hp[i], self._player_id[i], self._robot_id[i])
+        self.remove_robot(loc)
+        return robot
+
+    def _restore(self, loc, robot):
+        hp, player_id, robot_id = robot
+        self.add_robot(loc, player_id, hp, robot_id)
+
+    def is_robot(self, loc):
+        i = self._index(loc)
+        return i is not None and self._player_id[i] >= 0
+
+    def _iter_robots(self):
+        if self._occupied is None:
+            self._occupied = [i for i, player_id in enumerate(self._player_id)
+                              if player_id >= 0]
+
+        hp = self._hp
+        player_id = self._player_id
+        robot_id = self._robot_id
+        locs = self._locs
+        for i in self._occupied:
+            yield locs[i], hp[i], player_id[i], robot_id[i]
+
+    # the arrays are small enough to copy right away
+    def fork(self):
+        state = super(ArrayGameState, self).fork()
+        state._hp = self._hp[:]
+        state._player_id = self._player_id[:]
+        state._robot_id = self._robot_id[:]
+        state.robots = RobotsView(state)
+        return state
+
+    def apply_delta(self, delta):
+        new_state = ArrayGameState(
+            self._settings,
+            next_robot_id=self._next_robot_id,
+            turn=self.turn + 1,
+            seed=self._random.seed)
+
+        size = self._size
+        hp = new_state._hp
+        player_id = new_state._player_id
+        robot_id = new_state._robot_id
+        count = 0
+
+        for delta_info in delta:
+            if delta_info.hp_end > 0:
+                # is this a new robot?
+                if delta_info.hp > 0:
+                    x, y = delta_info.loc
+                    new_robot_id = self._robot_id[x + y * size]
+                else:
+                    new_robot_id = new_state._next_robot_id
+                    new_state._next_robot_id += 1
+
+                x, y = delta_info.loc_end
+                i = x + y * size
+                if player_id[i] < 0:
+                    count += 1
+                hp[i] = delta_info.hp_end
+                player_id[i] = delta_info.player_id
+                robot_id[i] = new_robot_id
+
+        new_state._count = count
+        return new_state
+
+    def get_scores(self):
+        scores = [0, 0]
+
+        for player_id in self._player_id:
+            if player_id >= 0:
+                scores[player_id] += 1
+
+        return scores
@@ -0,0 +1,289 @@
+'''
+Lockstep engine that advances many independent games at once.
+
+Every per-cell quantity lives in a NumPy array shaped (game, cell), where a
+cell is x + y * board_size, so one call to BatchGame.run_turn resolves
+movement, collisions, attacks, suicides and spawning for all games together.
+Actions are given as two such arrays: an action code (GUARD, MOVE, ATTACK,
+SUICIDE) and a direction indexing OFFSETS for moves and attacks. Invalid
+actions are turned into guards, like Player does for regular bots.
+
+Attack damage and spawn locations come from a NumPy random stream, so a
+batch is reproducible for a given seed but does not replay the same games as
+GameState would with the same seed.
+'''
+import numpy as np
+
+from rgkit.arraystate import cell_locs
+from rgkit.gamestate import GameState
+
+GUARD, MOVE, ATTACK, SUICIDE = range(4)
+ACTIONS = ('guard', 'move', 'attack', 'suicide')
+
+# same order as rg.locs_around
+OFFSETS = ((0, 1), (1, 0), (0, -1), (-1, 0))
+
+
+class BatchGame(object):
+    def __init__(self, settings, count, use_start=True, seed=None):
+        self._settings = settings
+        self.count = count
+        self.turn = 0
+        self._random = np.random.RandomState(seed)
+
+        size = settings.board_size
+        cells = size ** 2
+        self._size = size
+        self._cells = np.arange(cells)
+        self.locs = cell_locs(size)
+
+        self._obstacle = np.zeros(cells, bool)
+        for loc in settings.obstacles:
+            self._obstacle[self.index(loc)] = True
+        self._spawn = np.array(sorted(self.index(loc)
+                                      for loc in settings.spawn_coords),
+                               int)
+        self._is_spawn = np.zeros(cells, bool)
+        self._is_spawn[self._spawn] = True
+
+        # (cell, direction) -> neighbour, -1 if off the board; moves and
+        # attacks are additionally not allowed onto obstacles
+        self._around = np.empty((cells, len(OFFSETS)), int)
+        for i, (x, y) in enumerate(self.locs):
+            for d, (dx, dy) in enumerate(OFFSETS):
+                if 0 <= x + dx < size and 0 <= y + dy < size:
+                    self._around[i, d] = self.index((x + dx, y + dy))
+                else:
+                    self._around[i, d] = -1
+        self._targets = np.where(self._obstacle[self._around] |
+                                 (self._around < 0), -1, self._around)
+
+        self.hp = np.zeros((count, cells), int)
+        self.player_id = np.empty((count, cells), int)
+        self.player_id.fill(-1)
+        self.robot_id = np.empty((count, cells), int)
+        self.robot_id.fill(-1)
+        self._next_robot_id = np.zeros(count, int)
+
+        if use_start:
+            for game in xrange(count):
+                for loc in settings.start1:
+                    self.add_robot(game, loc, 0)
+                for loc in settings.start2:
+                    self.add_robot(game, loc, 1)
+
+    def index(self, loc):
+        return loc[0] + loc[1] * self._size
+
+    def add_robot(self, game, loc, player_id, hp=None, robot_id=None):
+        if hp is None:
+            hp = self._settings.robot_hp
+
+        if robot_id is None:
+            robot_id = self._next_robot_id[game]
+            self._next_robot_id[game] += 1
+
+        i = self.index(loc)
+        self.hp[game, i] = hp
+        self.player_id[game, i] = player_id
+        self.robot_id[game, i] = robot_id
+
+    def get_scores(self):
+        return np.column_stack([(self.player_id == 0).sum(axis=1),
+                                (self.player_id == 1).sum(axis=1)])
+
+    # export one game of the batch as a regular GameState
+    def get_state(self, game):
+        state = GameState(self._settings, turn=self.turn,
+                          next_robot_id=int(self._next_robot_id[game]))
+        for i in np.flatnonzero(self.player_id[game] >= 0):
+            state.add_robot(self.locs[i], int(self.player_id[game, i]),
+                            int(self.hp[game, i]),
+                            int(self.robot_id[game, i]))
+        return state
+
+    # actions_per_game = [{loc: action}] with one dict per game
+    # returns (action codes, directions) arrays for run_turn
+    def encode_actions(self, actions_per_game):
+        codes = np.zeros(self.hp.shape, int)
+        directions = np.zeros(self.hp.shape, int)
+
+        for game, actions in enumerate(actions_per_game):
+            for loc, action in actions.iteritems():
+                i = self.index(loc)
+                try:
+                    code = ACTIONS.index(action[0])
+                    if code in (MOVE, ATTACK):
+                        offset = (action[1][0] - loc[0],
+                                  action[1][1] - loc[1])
+                        directions[game, i] = OFFSETS.index(offset)
+                except (ValueError, TypeError, IndexError):
+                    code = GUARD
+                codes[game, i] = code
+
+        return codes, directions
+
+    def run_turn(self, actions, directions=None, spawn=True):
+        settings = self._settings
+        count, cells = self.hp.shape
+        size = count * cells
+
+        # everything below works on the list of robots across all games,
+        # dense (game * cell) arrays are only used as lookup tables
+        games, here = np.nonzero(self.player_id >= 0)
+        flat = games * cells + here
+        player_id = self.player_id.ravel()[flat]
+        enemy = 1 - player_id
+        hp = self.hp.ravel()[flat]
+        robot_id = self.robot_id.ravel()[flat]
+
+        # anything that is not a valid action becomes a guard
+        action = np.asarray(actions).ravel()[flat]
+        if directions is None:
+            direction = np.zeros(len(flat), int)
+        else:
+            direction = np.asarray(directions).ravel()[flat]
+        valid_dir = (direction >= 0) & (direction < len(OFFSETS))
+        target = self._targets[here, np.where(valid_dir, direction, 0)]
+        aimed = (action == MOVE) | (action == ATTACK)
+        invalid = (aimed & (~valid_dir | (target < 0))) | \
+            (action < GUARD) | (action > SUICIDE)
+        action = np.where(invalid, GUARD, action)
+
+        move = action == MOVE
+        dest = np.where(move, target, here)
+        flat_dest = games * cells + dest
+
+        # {cell: robot on it}
+        occupant = np.empty(size, int)
+        occupant.fill(-1)
+        occupant[flat] = np.arange(len(flat))
+        blocker = occupant[flat_dest]
+        has_blocker = blocker >= 0
+        blocker_dest = np.where(has_blocker, dest[blocker], -1)
+
+        # {cell * 2 + player: number of that player's robots that want to
+        # end up on cell}
+        heading = np.bincount(flat_dest * 2 + player_id, minlength=size * 2)
+        crowd = heading[flat_dest * 2] + heading[flat_dest * 2 + 1]
+
+        # see gamestate.resolve_moves
+        stuck = (crowd > 1) | (move & has_blocker & (blocker_dest == here))
+        while True:
+            blocked = move & has_blocker & stuck[blocker] & ~stuck
+            if not blocked.any():
+                break
+            stuck |= blocked
+
+        loc_end = np.where(stuck, here, dest)
+
+        # number of enemies each robot collided with: everyone heading for
+        # its destination, or just the robot there if that one stays, plus
+        # everyone heading for its own square if it stays itself
+        blocker_stuck = has_blocker & stuck[blocker]
+        enemy_blocker = has_blocker & (player_id[blocker] == enemy)
+        collided = np.where(blocker_stuck, enemy_blocker,
+                            heading[flat_dest * 2 + enemy])
+        collided += np.where(stuck, heading[flat * 2 + enemy], 0)
+        collided -= (stuck & blocker_stuck & enemy_blocker &
+                     (dest != here) & (blocker_dest == here))
+        hp_end = hp - np.where(action != GUARD, collided, 0) * \
+            settings.collision_damage
+
+        # {cell * 2 + player: damage dealt there by that player}
+        attack = action == ATTACK
+        rolls = self._random.randint(settings.attack_range[0],
+                                     settings.attack_range[1] + 1,
+                                     size=attack.sum())
+        hits = [(games * cells + target)[attack] * 2 + player_id[attack]]
+        damages = [rolls]
+
+        suicide = action == SUICIDE
+        hits.append(flat[suicide] * 2 + enemy[suicide])
+        damages.append(np.repeat(settings.robot_hp, suicide.sum()))
+        for d in xrange(len(OFFSETS)):
+            around = self._around[here, d]
+            mask = suicide & (around >= 0)
+            hits.append((games * cells + around)[mask] * 2 +
+                        player_id[mask])
+            damages.append(np.repeat(settings.suicide_damage, mask.sum()))
+
+        damage = np.bincount(np.concatenate(hits),
+                             weights=np.concatenate(damages),
+                             minlength=size * 2).astype(int)
+
+        flat_end = games * cells + loc_end
+        taken = damage[flat_end * 2 + enemy]
+        taken = np.where(action == GUARD, taken // 2, taken)
+        hp_end -= taken
+
+        spawning = spawn and self.turn % settings.spawn_every == 0
+        if spawning:
+            # clear bots on spawn
+            hp_end[self._is_spawn[loc_end]] = 0
+
+        new_hp = self.hp.ravel()
+        new_player_id = self.player_id.ravel()
+        new_robot_id = self.robot_id.ravel()
+        new_hp[flat] = 0
+        new_player_id[flat] = -1
+        new_robot_id[flat] = -1
+
+        alive = hp_end > 0
+        new_hp[flat_end[alive]] = hp_end[alive]
+        new_player_id[flat_end[alive]] = player_id[alive]
+        new_robot_id[flat_end[alive]] = robot_id[alive]
+
+        if spawning:
+            per_player = settings.spawn_per_player
+            order = np.argsort(
+                self._random.random_sample((count, len(self._spawn))),
+                axis=1)[:, :per_player * 2]
+            for k in xrange(per_player * 2):
+                spawned = np.arange(count) * cells + self._spawn[order[:, k]]
+                new_hp[spawned] = settings.robot_hp
+                new_player_id[spawned] = k // per_player
+                new_robot_id[spawned] = self._next_robot_id + k
+            self._next_robot_id += per_player * 2
+
+        self.turn += 1
+
+    # bots = [bot1, bot2], each with act(batch, player_id) returning
+    # (action codes, directions) arrays; only the cells holding that
+    # player's robots are read
+    def get_actions(self, bots):
+        actions = np.zeros(self.hp.shape, int)
+        directions = np.zeros(self.hp.shape, int)
+
+        for player_id, bot in enumerate(bots):
+            codes, dirs = bot.act(self, player_id)
+            mine = self.player_id == player_id
+            actions = np.where(mine, codes, actions)
+            if dirs is not None:
+                directions = np.where(mine, dirs, directions)
+
+        return actions, directions
+
+    def run_all_turns(self, bot1, bot2):
+        while self.turn < self._settings.max_turns:
+            self.run_turn(*self.get_actions([bot1, bot2]))
+
+        return self.get_scores()
+
+
+class GuardBot(object):
+    def act(self, batch, player_id):
+        return np.zeros(batch.hp.shape, int), None
+
+
+class RandomBot(object):
+    '''Picks a random action and direction for every robot.'''
+
+    def __init__(self, seed=None):
+        self._random = np.random.RandomState(seed)
+
+    def act(self, batch, player_id):
+        return (self._random.randint(len(ACTIONS), size=batch.hp.shape,
+                                     dtype=np.int8),
+                self._random.randint(len(OFFSETS), size=batch.hp.shape,
+                                     dtype=np.int8))
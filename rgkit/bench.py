@@ -0,0 +1,240 @@
+#!/usr/bin/env python2
+'''
+Speed benchmarks of the engine, the rg helpers and whole games.
+
+Every benchmark reports the best time per operation over a few repeats.
+Results can be saved as JSON with --output and compared against a saved
+run with --baseline, which flags every benchmark that got slower by more
+than --threshold and exits with status 1 if any did.
+'''
+import argparse
+from argparse import RawTextHelpFormatter
+import json
+import pkg_resources
+import random
+import sys
+import timeit
+
+from rgkit import game, rg
+from rgkit.gamestate import GameState
+from rgkit.settings import AttrDict
+
+parser = argparse.ArgumentParser(description="Robot game benchmarks.",
+                                 formatter_class=RawTextHelpFormatter)
+parser.add_argument("-m", "--map",
+                    help="User-specified map file.",
+                    default="default")
+parser.add_argument("-o", "--output", metavar="FILE",
+                    help="Write the results to FILE as JSON.")
+parser.add_argument("-b", "--baseline", metavar="FILE",
+                    help="Compare against results saved with --output.")
+parser.add_argument("-t", "--threshold", type=float, default=0.1,
+                    help="Slowdown over the baseline that counts as a\n\
+regression, default: 0.1 (10%%)")
+parser.add_argument("-r", "--repeat", type=int, default=5,
+                    help="Repeats per benchmark, the best one counts,\n\
+default: 5")
+parser.add_argument("-k", "--filter", metavar="TEXT",
+                    help="Only run benchmarks whose name contains TEXT.")
+
+
+def read_bot(name):
+    return open(pkg_resources.resource_filename(
+        'rgkit', 'bots/{0}.py'.format(name))).read()
+
+
+def crowded_state(settings, density, seed=0):
+    '''
+    State with robots of random players on roughly density of the free
+    cells of the board.
+    '''
+    rand = random.Random(seed)
+    state = GameState(settings, turn=1, seed=seed)
+    for loc, bits in sorted(settings.topology.types.iteritems()):
+        if not bits & rg.OBSTACLE and rand.random() < density:
+            state.add_robot(loc, rand.randint(0, 1))
+    return state
+
+
+def random_actions(state, seed=0):
+    rand = random.Random(seed)
+    actions = {}
+    for loc in state.robots:
+        targets = rg.locs_around(loc, filter_out=['invalid', 'obstacle'])
+        choice = rand.random()
+        if not targets or choice < 0.2:
+            actions[loc] = ['guard']
+        elif choice < 0.6:
+            actions[loc] = ['move', rand.choice(targets)]
+        elif choice < 0.95:
+            actions[loc] = ['attack', rand.choice(targets)]
+        else:
+            actions[loc] = ['suicide']
+    return actions
+
+
+# what a bot does with game_info: 5 passes over every robot
+def scan_game_info(state, player_id, passes=5):
+    robots = state.get_game_info(player_id).robots
+    for _ in xrange(passes):
+        for loc in robots:
+            robot = robots[loc]
+            robot.hp
+            robot.player_id
+
+
+# scan_game_info over the AttrDict copies that game_info used to hand out,
+# as the reference for it
+def scan_copied_robots(state, player_id, passes=5):
+    robots = dict((loc, AttrDict(robot))
+                  for loc, robot in state.robots.iteritems())
+    for robot in robots.itervalues():
+        if robot.player_id != player_id:
+            del robot.robot_id
+    for _ in xrange(passes):
+        for loc in robots:
+            robot = robots[loc]
+            robot.hp
+            robot.player_id
+
+
+# returns [(name, function, operations per call of function, setup)], where
+# setup is None or a function to call once before timing function
+def benchmarks(settings):
+    cases = []
+
+    for density in (0.1, 0.5):
+        state = crowded_state(settings, density)
+        actions = random_actions(state)
+        delta = state.get_delta(actions)
+        robots = len(state.robots)
+        name = 'crowded{0:.0f}'.format(density * 100)
+
+        cases.append(('gamestate.get_delta.' + name,
+                      lambda state=state, actions=actions:
+                      state.get_delta(actions), 1, None))
+        cases.append(('gamestate.apply_delta.' + name,
+                      lambda state=state, delta=delta:
+                      state.apply_delta(delta), 1, None))
+        cases.append(('gamestate.get_game_info.' + name,
+                      lambda state=state: state.get_game_info(0), 1, None))
+        cases.append(('gamestate.get_game_info_scan.' + name,
+                      lambda state=state: scan_game_info(state, 0), 1, None))
+        cases.append(('gamestate.copy_robots_scan.' + name,
+                      lambda state=state: scan_copied_robots(state, 0), 1,
+                      None))
+
+        def validate(state=state, actions=actions):
+            for loc, action in actions.iteritems():
+                state.is_valid_action(loc, action)
+        cases.append(('gamestate.is_valid_action.' + name, validate, robots,
+                      None))
+
+    locs = sorted(settings.topology.types)
+
+    def loc_types():
+        for loc in locs:
+            rg.loc_types(loc)
+
+    def locs_around():
+        for loc in locs:
+            rg.locs_around(loc, filter_out=['invalid', 'obstacle'])
+
+    def toward():
+        for loc in locs:
+            rg.toward(loc, rg.CENTER_POINT)
+
+    def path_dist():
+        for loc in locs:
+            rg.path_dist(loc, rg.CENTER_POINT)
+
+    def build_paths():
+        rg.path_dist(rg.CENTER_POINT, rg.CENTER_POINT)
+
+    cases += [('rg.loc_types', loc_types, len(locs), None),
+              ('rg.locs_around', locs_around, len(locs), None),
+              ('rg.toward', toward, len(locs), None),
+              ('rg.path_dist', path_dist, len(locs), build_paths)]
+
+    for name1, name2 in (('guardbot', 'guardbot'),
+                         ('randombot', 'randombot'),
+                         ('guardbot', 'randombot')):
+        code1, code2 = read_bot(name1), read_bot(name2)
+
+        def run_all_turns(code1=code1, code2=code2):
+            g = game.Game(game.Player(code1), game.Player(code2), seed=1,
+                          quiet=2)
+            g.run_all_turns()
+        cases.append(('game.run_all_turns.{0}-{1}'.format(name1, name2),
+                      run_all_turns, 1, None))
+
+    return cases
+
+
+# returns {name: seconds per operation}
+def run_benchmarks(settings, repeat=5, name_filter=None):
+    results = {}
+    for name, function, ops, setup in benchmarks(settings):
+        if name_filter and name_filter not in name:
+            continue
+        if setup is not None:
+            setup()
+
+        # aim for calls of at least 0.1s, so that timer resolution and
+        # one-off costs do not matter
+        number = 1
+        while timeit.timeit(function, number=number) < 0.1 and number < 1e6:
+            number *= 10
+        best = min(timeit.repeat(function, number=number, repeat=repeat))
+        results[name] = best / number / ops
+    return results
+
+
+# returns [(name, baseline seconds, seconds, relative change)] for every
+# benchmark in both, and whether any of them regressed past threshold
+def compare(results, baseline, threshold):
+    rows = []
+    regressed = False
+    for name in sorted(results):
+        if name in baseline:
+            change = results[name] / baseline[name] - 1
+            rows.append((name, baseline[name], results[name], change))
+            regressed = regressed or change > threshold
+    return rows, regressed
+
+
+def format_time(seconds):
+    if seconds < 1e-3:
+        return '{0:.2f} us'.format(seconds * 1e6)
+    return '{0:.2f} ms'.format(seconds * 1e3)
+
+
+def main():
+    args = parser.parse_args()
+    settings = game.init_settings(args.map)
+
+    results = run_benchmarks(settings, args.repeat, args.filter)
+    for name in sorted(results):
+        print '{0:45} {1:>12}'.format(name, format_time(results[name]))
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({'map': args.map, 'results': results}, f, indent=2,
+                      sort_keys=True)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)['results']
+        rows, regressed = compare(results, baseline, args.threshold)
+
+        print
+        for name, before, after, change in rows:
+            flag = ' REGRESSION' if change > args.threshold else ''
+            print '{0:45} {1:>12} -> {2:>12} {3:+7.1%}{4}'.format(
+                name, format_time(before), format_time(after), change, flag)
+        if regressed:
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -3,4 +3,4 @@ import random
 
 class Robot:
     def act(self, game):
-        return random.randomchoice((['guard'], ['suicide']))
+        return random.choice((['guard'], ['suicide']))
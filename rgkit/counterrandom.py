@@ -0,0 +1,50 @@
+'''
+Counter-based random numbers.
+
+Every value is a pure function of (match seed, turn, purpose, index), where
+index is typically a robot_id, so the randomness of any turn can be derived
+directly without replaying the turns before it and without keeping or
+constructing random.Random objects. Values are splitmix64 outputs.
+'''
+import hashlib
+
+# purposes
+SPAWN, ATTACK, PLAYER = range(3)
+
+_MASK = (1 << 64) - 1
+_GAMMA = 0x9e3779b97f4a7c15
+
+
+def _mix(z):
+    z = ((z ^ (z >> 30)) * 0xbf58476d1ce4e5b9) & _MASK
+    z = ((z ^ (z >> 27)) * 0x94d049bb133111eb) & _MASK
+    return z ^ (z >> 31)
+
+
+class CounterRandom(object):
+    def __init__(self, seed):
+        self.seed = str(seed)
+        self._key = int(hashlib.md5(self.seed).hexdigest()[:16], 16)
+
+    def stream(self, turn, purpose):
+        return Stream(_mix((self._key + _mix(turn * 4 + purpose + 1)) &
+                           _MASK))
+
+
+class Stream(object):
+    '''The random numbers of one (seed, turn, purpose).'''
+
+    def __init__(self, key):
+        self._key = key
+
+    # 64 random bits
+    def bits(self, index):
+        return _mix((self._key + (index + 1) * _GAMMA) & _MASK)
+
+    # float in [0, 1)
+    def random(self, index):
+        return (self.bits(index) >> 11) * (1.0 / (1 << 53))
+
+    # integer in [a, b]
+    def randint(self, index, a, b):
+        return a + self.bits(index) % (b - a + 1)
@@ -1,6 +1,9 @@
 import imp
+import math
 import random
+import signal
 import sys
+import time
 import traceback
 try:
     import threading
@@ -8,9 +11,9 @@ except ImportError:
     import dummy_threading as threading
 
 
-from rgkit import rg
+from rgkit import counterrandom, rg
 from rgkit.gamestate import GameState
-from rgkit.settings import settings
+from rgkit.settings import AttrDict, settings
 from rgkit.maps import maps
 
 sys.modules['rg'] = rg  # preserve backwards compatible robot imports
@@ -34,13 +37,65 @@ def init_settings(map_name):
     settings.obstacles = map_data['obstacle']
     settings.start1 = map_data['start1']
     settings.start2 = map_data['start2']
+    settings.topology = rg.get_topology(settings)
     rg.set_settings(settings)
     return settings
 
 
+class UserCodeTimeout(Exception):
+    pass
+
+
+class UserCodeTimer(object):
+    '''
+    Interrupts user code that runs past its time with UserCodeTimeout,
+    raising it again every interval seconds until the timer is stopped, so
+    code that catches the first one still cannot keep running.
+
+    This needs SIGALRM, so it only works in the main thread on Unix;
+    elsewhere an overrun is only noticed once the code returns.
+    '''
+
+    interval = 0.01
+
+    def __init__(self):
+        self._enabled = (hasattr(signal, 'setitimer') and
+                         threading.current_thread().name == 'MainThread')
+        self._old_handler = None
+
+    def __enter__(self):
+        if self._enabled:
+            self._old_handler = signal.signal(signal.SIGALRM, self._timeout)
+        return self
+
+    def __exit__(self, *exc_info):
+        if self._enabled:
+            signal.setitimer(signal.ITIMER_REAL, 0)
+            signal.signal(signal.SIGALRM, self._old_handler)
+
+    def _timeout(self, signum, frame):
+        raise UserCodeTimeout()
+
+    def start(self, seconds):
+        if self._enabled:
+            signal.setitimer(signal.ITIMER_REAL, max(seconds, 1e-6),
+                             self.interval)
+
+    def stop(self):
+        if self._enabled:
+            signal.setitimer(signal.ITIMER_REAL, 0)
+
+
 class Player(object):
     def __init__(self, code=None, robot=None):
         self._player_id = None  # must be set using set_player_id
+        # [(turn, robot_id, seconds spent in act)]
+        self.timings = []
+        self.timeouts = 0
+        # seconds spent checking the actions returned by act
+        self.validation_time = 0.0
+        # set by Game to its tracing.Tracer, if any
+        self.tracer = None
 
         if code is not None:
             self._code = code
@@ -54,12 +109,54 @@ class Player(object):
     def reload(self):
         self._module = imp.new_module('usercode%d' % id(self))
         exec self._code in self._module.__dict__
+        self.reset()
+
+    # fresh Robot instance without executing the module again
+    def reset(self):
         self._robot = self._module.__dict__['Robot']()
+        self.timings = []
+        self.timeouts = 0
+        self.validation_time = 0.0
+
+    # act() latencies in milliseconds
+    def get_timing_stats(self):
+        times = sorted(seconds * 1000 for _, _, seconds in self.timings)
+        stats = AttrDict(calls=len(times), mean=0, p95=0, max=0,
+                         timeouts=self.timeouts)
+        if times:
+            stats.mean = sum(times) / len(times)
+            stats.p95 = times[int(math.ceil(len(times) * 0.95)) - 1]
+            stats.max = times[-1]
+        return stats
 
     def set_player_id(self, player_id):
         self._player_id = player_id
 
-    def _get_action(self, game_state, game_info, robot, seed):
+    # calls func(game_info), recording its time under robot_id and raising
+    # UserCodeTimeout if it did not finish before deadline
+    def _run_usercode(self, func, game_info, turn, robot_id, deadline, timer):
+        start = time.time()
+        if deadline is not None:
+            if start >= deadline:
+                raise UserCodeTimeout()
+            timer.start(deadline - start)
+        try:
+            result = func(game_info)
+        finally:
+            timer.stop()
+            end = time.time()
+            self.timings.append((turn, robot_id, end - start))
+            if self.tracer is not None:
+                self.tracer.begin('act', {'turn': turn,
+                                          'player': self._player_id,
+                                          'robot_id': robot_id}, start)
+                self.tracer.end('act', end)
+        if deadline is not None and end > deadline:
+            raise UserCodeTimeout()
+        return result
+
+    def _get_action(self, game_state, game_info, robot, seed, deadline,
+                    timer):
         try:
             random.seed(seed)
 
@@ -67,56 +164,209 @@ class Player(object):
             self._robot.hp = robot.hp
             self._robot.player_id = robot.player_id
             self._robot.robot_id = robot.robot_id
-            action = self._robot.act(game_info)
-
-            if not game_state.is_valid_action(robot.location, action):
+            action = self._run_usercode(self._robot.act, game_info,
+                                        game_state.turn, robot.robot_id,
+                                        deadline, timer)
+
+            start = time.time()
+            valid = game_state.is_valid_action(robot.location, action)
+            self.validation_time += time.time() - start
+            if not valid:
                 raise Exception(
                     'Bot {0}: {1} is not a valid action from {2}'.format(
                         robot.robot_id + 1, action, robot.location)
                 )
 
+        except UserCodeTimeout:
+            print 'Bot {0}: out of time on turn {1}'.format(
+                robot.robot_id + 1, game_state.turn)
+            self.timeouts += 1
+            action = ['guard']
+
         except:
             traceback.print_exc(file=sys.stdout)
             action = ['guard']
 
         return action
 
-    # returns map (loc) -> (action) for all bots of this player
-    # 'fixes' invalid actions
-    def get_actions(self, game_state, seed):
-        game_info = game_state.get_game_info(self._player_id)
+    # act_all(game) returns {loc: action} for all robots of the player at
+    # once; its time is recorded with a robot_id of None
+    def _get_all_actions(self, game_state, game_info, seed, deadline, timer):
+        try:
+            random.seed(seed)
+
+            self._robot.player_id = self._player_id
+            all_actions = self._run_usercode(self._robot.act_all, game_info,
+                                             game_state.turn, None,
+                                             deadline, timer)
+
+            if not isinstance(all_actions, dict):
+                raise Exception(
+                    'Player {0}: act_all returned {1}, not a dict'.format(
+                        self._player_id + 1, all_actions))
+
+        except UserCodeTimeout:
+            print 'Player {0}: out of time on turn {1}'.format(
+                self._player_id + 1, game_state.turn)
+            self.timeouts += 1
+            all_actions = {}
+
+        except:
+            traceback.print_exc(file=sys.stdout)
+            all_actions = {}
 
         actions = {}
 
+        start = time.time()
         for loc, robot in game_state.robots.iteritems():
             if robot.player_id == self._player_id:
-                actions[loc] = self._get_action(game_state,
-                                                game_info, robot, seed)
+                action = all_actions.get(loc)
+                if not game_state.is_valid_action(loc, action):
+                    if all_actions:
+                        print ('Bot {0}: {1} is not a valid action '
+                               'from {2}').format(robot.robot_id + 1, action,
+                                                  loc)
+                    action = ['guard']
+                actions[loc] = action
+        self.validation_time += time.time() - start
 
         return actions
 
+    # returns map (loc) -> (action) for all bots of this player
+    # 'fixes' invalid actions, and those of robots that did not finish
+    # within this player's settings.max_usercode_time for the turn
+    def get_actions(self, game_state, seed):
+        if self.tracer is None:
+            return self._get_actions(game_state, seed)
+        with self.tracer.span('get_actions', {'turn': game_state.turn,
+                                              'player': self._player_id}):
+            return self._get_actions(game_state, seed)
+
+    def _get_actions(self, game_state, seed):
+        game_info = game_state.get_game_info(self._player_id)
+
+        deadline = None
+        if settings.max_usercode_time is not None:
+            deadline = time.time() + settings.max_usercode_time / 1000.0
+
+        with UserCodeTimer() as timer:
+            if hasattr(self._robot, 'act_all'):
+                return self._get_all_actions(game_state, game_info, seed,
+                                             deadline, timer)
+
+            actions = {}
+
+            for loc, robot in game_state.robots.iteritems():
+                if robot.player_id == self._player_id:
+                    actions[loc] = self._get_action(game_state, game_info,
+                                                    robot, seed, deadline,
+                                                    timer)
+
+        return actions
+
+
+# phases of Profile in the order they are reported; 'game_info' is the
+# rest of the time spent getting a player's actions, mostly building the
+# game_info handed to act
+PROFILE_PHASES = ('act (player 1)', 'act (player 2)', 'validation',
+                  'game_info', 'get_delta', 'apply_delta', 'recording',
+                  'rendering')
+
+
+# adds the time spent in a block to a Profile and/or traces it as a span
+class _PhaseTimer(object):
+    def __init__(self, profile, tracer, phase, args=None):
+        self._profile = profile
+        self._tracer = tracer
+        self._phase = phase
+        self._args = args
+
+    def __enter__(self):
+        self._start = time.time()
+        if self._tracer is not None:
+            self._tracer.begin(self._phase, self._args, self._start)
+
+    def __exit__(self, *exc_info):
+        end = time.time()
+        if self._profile is not None:
+            self._profile.add(self._phase, end - self._start)
+        if self._tracer is not None:
+            self._tracer.end(self._phase, end)
+
+
+class _NullContext(object):
+    def __enter__(self):
+        pass
+
+    def __exit__(self, *exc_info):
+        pass
+
+
+_null_context = _NullContext()
+
+
+class Profile(dict):
+    '''
+    Wall time in seconds per phase of play, summed over the turns and games
+    it was handed to. A plain dict otherwise, so that it pickles and can be
+    merged across processes.
+    '''
+
+    def add(self, phase, seconds):
+        self[phase] = self.get(phase, 0.0) + seconds
+
+    def merge(self, other):
+        for phase, seconds in other.iteritems():
+            self.add(phase, seconds)
+
+    # with profile.phase(name): ... adds the time spent in the block
+    def phase(self, phase):
+        return _PhaseTimer(self, None, phase)
+
+
+# number of states Game keeps around after rebuilding them from keyframes
+REBUILT_STATES = 8
+
 
 class Game(object):
     def __init__(self, player1, player2, record_actions=False,
                  record_history=False, print_info=False,
-                 seed=None, quiet=0):
+                 seed=None, quiet=0, state_cls=GameState,
+                 keyframe_every=None, history_sink=None, profile=None,
+                 tracer=None):
         self._settings = settings
         self._player1 = player1
         self._player1.set_player_id(0)
         self._player2 = player2
         self._player2.set_player_id(1)
-        self._state = GameState(self._settings, use_start=True, seed=seed)
-        self._record_actions = record_actions
-        self._record_history = record_history
-        self._print_info = print_info
+        # tracing.Tracer that gets the turns, their phases and act calls
+        self._tracer = tracer
+        self._player1.tracer = tracer
+        self._player2.tracer = tracer
         if seed is None:
             seed = random.randint(0, sys.maxint)
         self.seed = str(seed)
-        self._random = random.Random(seed)
+        self._random = counterrandom.CounterRandom(self.seed)
+        self._state = state_cls(self._settings, use_start=True, seed=self.seed)
+        self._record_actions = record_actions
+        self._record_history = record_history
+        self._print_info = print_info
         self._quiet = quiet
 
         self._actions_on_turn = {}
         self._states = {}
+        # with keyframe_every = K, only every K-th state is kept and the
+        # others are rebuilt from the deltas leading up to them
+        self._keyframe_every = keyframe_every
+        self._deltas = {}
+        self._rebuilt = []  # [(turn, state)], most recently used last
+        # gets each entry of history through write_turn and the action
+        # records of its turn through write_actions as soon as they are made,
+        # see replay.ReplayWriter and replay.JsonLinesWriter; with a sink,
+        # only the latest states and action records are kept in memory
+        self._history_sink = history_sink
+        # Profile that gets the time spent in each phase of every turn
+        self._profile = profile
         self.history = []  # TODO: make private
 
     # actions_on_turn = {loc: log_item}
@@ -127,7 +377,8 @@ class Game(object):
     #     'hp': hp,
     #     'player': player_id,
     #     'loc_end': loc_end,
-    #     'hp_end': hp_end
+    #     'hp_end': hp_end,
+    #     'robot_id': robot_id, or None if the robot spawns this turn
     # }
     #
     # or dummy if turn == settings.max_turn
@@ -136,13 +387,49 @@ class Game(object):
         return self._actions_on_turn[turn]
 
     def get_state(self, turn):
-        return self._states[turn]
+        if self._keyframe_every is None or turn in self._states:
+            return self._states[turn]
+        if turn == self._state.turn:
+            return self._state
+
+        for i, (rebuilt_turn, state) in enumerate(self._rebuilt):
+            if rebuilt_turn == turn:
+                self._rebuilt.append(self._rebuilt.pop(i))
+                return state
+
+        # replay from the closest keyframe or rebuilt state before turn
+        start = turn - turn % self._keyframe_every
+        state = self._states[start]
+        for rebuilt_turn, rebuilt in self._rebuilt:
+            if start < rebuilt_turn < turn:
+                start, state = rebuilt_turn, rebuilt
+
+        for replay_turn in xrange(start, turn):
+            state = state.apply_delta([
+                AttrDict(loc=loc, hp=hp, player_id=player_id,
+                         loc_end=loc_end, hp_end=hp_end)
+                for loc, hp, player_id, loc_end, hp_end
+                in self._deltas[replay_turn]])
+
+        self._rebuilt.append((turn, state))
+        if len(self._rebuilt) > REBUILT_STATES:
+            self._rebuilt.pop(0)
+        return state
 
     def _save_actions_on_turn(self, actions_on_turn, turn):
         self._actions_on_turn[turn] = actions_on_turn
 
     def _save_state(self, state, turn):
-        self._states[turn] = state
+        if self._keyframe_every is None or turn % self._keyframe_every == 0:
+            self._states[turn] = state
+
+    # delta = the delta that led from turn to turn + 1
+    def _save_delta(self, delta, turn):
+        if self._keyframe_every is not None:
+            self._deltas[turn] = tuple(
+                (delta_info.loc, delta_info.hp, delta_info.player_id,
+                 delta_info.loc_end, delta_info.hp_end)
+                for delta_info in delta)
 
     def _get_robots_actions(self):
         if self._quiet < 3:
@@ -150,10 +437,9 @@ class Game(object):
                 sys.stdout = NullDevice()
             if self._quiet >= 2:
                 sys.stderr = NullDevice()
-        seed1 = self._random.randint(0, sys.maxint)
-        actions = self._player1.get_actions(self._state, seed1)
-        seed2 = self._random.randint(0, sys.maxint)
-        actions2 = self._player2.get_actions(self._state, seed2)
+        stream = self._random.stream(self._state.turn, counterrandom.PLAYER)
+        actions = self._get_player_actions(self._player1, stream.bits(0))
+        actions2 = self._get_player_actions(self._player2, stream.bits(1))
         actions.update(actions2)
         if self._quiet < 3:
             if self._quiet >= 1:
@@ -163,6 +449,34 @@ class Game(object):
 
         return actions
 
+    def _get_player_actions(self, player, seed):
+        if self._profile is None:
+            return player.get_actions(self._state, seed)
+
+        calls = len(player.timings)
+        validation = player.validation_time
+        start = time.time()
+        actions = player.get_actions(self._state, seed)
+        total = time.time() - start
+
+        act = sum(seconds for _, _, seconds in player.timings[calls:])
+        validation = player.validation_time - validation
+        self._profile.add(PROFILE_PHASES[player._player_id], act)
+        self._profile.add('validation', validation)
+        self._profile.add('game_info', total - act - validation)
+        return actions
+
+    def _phase(self, phase):
+        if self._profile is None and self._tracer is None:
+            return _null_context
+        return _PhaseTimer(self._profile, self._tracer, phase,
+                           {'turn': self._state.turn})
+
+    def _span(self, name, args):
+        if self._tracer is None:
+            return _null_context
+        return self._tracer.span(name, args)
+
     def _make_history(self, actions):
         '''
         An aggregate of all bots and their actions this turn.
@@ -184,6 +498,23 @@ class Game(object):
             robots.append(robot_info)
         return robots
 
+    # actions_on_turn = the action records of the turn, for the sink
+    def _save_history(self, actions, actions_on_turn):
+        if self._record_history or self._history_sink is not None:
+            robots = self._make_history(actions)
+            if self._record_history:
+                self.history.append(robots)
+            if self._history_sink is not None:
+                self._history_sink.write_turn(robots)
+                self._history_sink.write_actions(actions_on_turn)
+
+    # drops what was kept of the turn before turn, once the sink has it
+    def _forget(self, turn):
+        if self._history_sink is not None:
+            self._states.pop(turn - 1, None)
+            self._deltas.pop(turn - 1, None)
+            self._actions_on_turn.pop(turn - 1, None)
+
     def _calculate_actions_on_turn(self, delta, actions):
         actions_on_turn = {}
 
@@ -196,9 +527,11 @@ class Game(object):
                     target = actions[loc][1]
                 else:
                     target = None
+                robot_id = self._state.robots[loc].robot_id
             else:
                 name = 'spawn'
                 target = None
+                robot_id = None
 
             # note that a spawned bot may overwrite an existing bot
             actions_on_turn[loc] = {
@@ -208,30 +541,41 @@ class Game(object):
                 'hp': delta_info.hp,
                 'player': delta_info.player_id,
                 'loc_end': delta_info.loc_end,
-                'hp_end': delta_info.hp_end
+                'hp_end': delta_info.hp_end,
+                'robot_id': robot_id
             }
 
         return actions_on_turn
 
     def run_turn(self):
-        if self._print_info:
-            print (' running turn %d ' % (self._state.turn)).center(70, '-')
+        with self._span('turn', {'turn': self._state.turn}):
+            if self._print_info:
+                print (' running turn %d ' % self._state.turn).center(70, '-')
 
-        actions = self._get_robots_actions()
+            actions = self._get_robots_actions()
 
-        delta = self._state.get_delta(actions)
+            with self._phase('get_delta'):
+                delta = self._state.get_delta(actions)
 
-        if self._record_actions:
-            actions_on_turn = self._calculate_actions_on_turn(delta, actions)
-            self._save_actions_on_turn(actions_on_turn, self._state.turn)
+            actions_on_turn = None
+            if self._record_actions or self._history_sink is not None:
+                with self._phase('recording'):
+                    actions_on_turn = self._calculate_actions_on_turn(
+                        delta, actions)
+                    if self._record_actions:
+                        self._save_actions_on_turn(actions_on_turn,
+                                                   self._state.turn)
 
-        new_state = self._state.apply_delta(delta)
-        self._save_state(new_state, new_state.turn)
+            with self._phase('apply_delta'):
+                new_state = self._state.apply_delta(delta)
 
-        if self._record_history:
-            self.history.append(self._make_history(actions))
+            with self._phase('recording'):
+                self._save_delta(delta, self._state.turn)
+                self._save_state(new_state, new_state.turn)
+                self._save_history(actions, actions_on_turn)
+                self._forget(self._state.turn)
 
-        self._state = new_state
+            self._state = new_state
 
     def run_all_turns(self):
         assert self._state.turn == 0
@@ -241,12 +585,9 @@ class Game(object):
 
         self._save_state(self._state, 0)
 
-        while self._state.turn < self._settings.max_turns:
-            self.run_turn()
-
-        # create last turn's state for server history
-        if self._record_history:
-            self.history.append(self._make_history({}))
+        with self._span('game', {'seed': self.seed}):
+            while self._state.turn < self._settings.max_turns:
+                self.run_turn()
 
         # create dummy data for last turn
         # TODO: render should be cleverer
@@ -260,12 +601,18 @@ class Game(object):
                 'hp': robot.hp,
                 'player': robot.player_id,
                 'loc_end': loc,
-                'hp_end': robot.hp
+                'hp_end': robot.hp,
+                'robot_id': robot.robot_id
             }
 
             actions_on_turn[loc] = log_item
 
+        # create last turn's state for server history
+        with self._phase('recording'):
+            self._save_history({}, actions_on_turn)
+
         self._save_actions_on_turn(actions_on_turn, self._settings.max_turns)
+        self._forget(self._settings.max_turns)
 
     def get_scores(self):
         return self.get_state(self._settings.max_turns).get_scores()
@@ -1,11 +1,107 @@
+import functools
 import random
 import sys
 from collections import defaultdict
 
-from rgkit import rg
+from rgkit import counterrandom, rg
 from rgkit.settings import AttrDict
 
 
+def _read_only(self, *args, **kwargs):
+    raise TypeError('robot info is read-only')
+
+
+class RobotInfo(dict):
+    '''
+    Read-only copy of a robot as a player sees it, see robot_info.
+
+    Supports both robot.hp and robot['hp'] at plain dict speed, like the
+    AttrDicts it replaces; robot_id is left out for players that do not
+    own the robot.
+    '''
+
+    __setitem__ = __delitem__ = clear = pop = popitem = setdefault = \
+        update = _read_only
+
+    def __setattr__(self, name, value):
+        raise AttributeError('robot info is read-only')
+
+    def __delattr__(self, name):
+        raise AttributeError('robot info is read-only')
+
+    def __reduce__(self):
+        return (robot_info, (dict(self),))
+
+
+# makes a RobotInfo out of a dict or keyword arguments
+def robot_info(*args, **kwargs):
+    info = RobotInfo(*args, **kwargs)
+    object.__setattr__(info, '__dict__', info)
+    return info
+
+
+# robots = iterable of robot locations
+# actions = {loc: action}
+# returns ({loc: loc_end}, {loc: set(robots collided with loc)})
+def resolve_moves(robots, actions):
+    dest = {}
+    for loc in robots:
+        if actions[loc][0] == 'move':
+            dest[loc] = actions[loc][1]
+        else:
+            dest[loc] = loc
+
+    # {loc: [robots that want to end up on loc]}
+    hitpoints = defaultdict(list)
+    for loc, loc_end in dest.iteritems():
+        hitpoints[loc_end].append(loc)
+
+    # robots fighting over a square or trying to swap places stay where they
+    # are, and so does everyone trying to move into a robot that stays
+    stuck = set()
+    todo = [loc for loc, loc_end in dest.iteritems()
+            if len(hitpoints[loc_end]) > 1 or
+            (loc_end != loc and dest.get(loc_end) == loc)]
+    while todo:
+        loc = todo.pop()
+        if loc not in stuck:
+            stuck.add(loc)
+            todo.extend(hitpoints[loc])
+
+    loc_ends = {}
+    collisions = defaultdict(set)
+    for loc, loc_end in dest.iteritems():
+        if loc in stuck:
+            loc_ends[loc] = loc
+        else:
+            loc_ends[loc] = loc_end
+
+        # a robot that stays blocks everyone else from its square
+        if loc_end in stuck:
+            rivals = (loc_end,)
+        else:
+            rivals = hitpoints[loc_end]
+
+        for loc2 in rivals:
+            collisions[loc].add(loc2)
+            collisions[loc2].add(loc)
+
+    return loc_ends, collisions
+
+
+# game_info.simulate: GameState.simulate over a state_cls state rebuilt from
+# robots = game_info.robots, with robot_id -1 for the robots of the enemy;
+# the seed does not matter as simulate uses fixed attack damage and leaves
+# out spawns
+def simulate_copy(state_cls, settings, turn, robots, player_id, my_actions,
+                  enemy_policy=None, damage='expected'):
+    state = state_cls(settings, turn=turn, seed=0)
+    for loc, robot in robots.iteritems():
+        state.add_robot(loc, robot.player_id, robot.hp,
+                        robot.get('robot_id', -1))
+    return state.simulate(player_id, my_actions, enemy_policy, damage)
+
+
 class GameState(object):
     def __init__(self, settings, use_start=False,
                  turn=0, next_robot_id=0, seed=None):
@@ -13,19 +109,22 @@ class GameState(object):
 
         if seed is None:
             seed = random.randint(0, sys.maxint)
-        self._seed = str(seed)
-        self._spawn_random = random.Random(self._seed + 's')
-        self._attack_random = random.Random(self._seed + 'a')
+        self._random = counterrandom.CounterRandom(seed)
 
         self.robots = {}
+        self._robots_shared = False
+        self._undo_log = []
         self.turn = turn
         self._next_robot_id = next_robot_id
 
         if use_start:
-            for loc in self._settings.start1:
-                self.add_robot(loc, 0)
-            for loc in self._settings.start2:
-                self.add_robot(loc, 1)
+            self._add_start_robots()
+
+    def _add_start_robots(self):
+        for loc in self._settings.start1:
+            self.add_robot(loc, 0)
+        for loc in self._settings.start2:
+            self.add_robot(loc, 1)
 
     def add_robot(self, loc, player_id, hp=None, robot_id=None):
         if hp is None:
@@ -35,6 +134,7 @@ class GameState(object):
             robot_id = self._next_robot_id
             self._next_robot_id += 1
 
+        self._own_robots()
         self.robots[loc] = AttrDict({
             'location': loc,
             'hp': hp,
@@ -44,13 +144,36 @@ class GameState(object):
 
     def remove_robot(self, loc):
         if self.is_robot(loc):
+            self._own_robots()
             del self.robots[loc]
 
+    # forked states share the robots dict until one of them changes it
+    def _own_robots(self):
+        if self._robots_shared:
+            self.robots = dict(self.robots)
+            self._robots_shared = False
+
+    # returns a copy of this state that can be changed and searched
+    # independently, without copying anything up front; robots must only
+    # be changed through add_robot and remove_robot
+    def fork(self):
+        state = self.__class__.__new__(self.__class__)
+        state.__dict__.update(self.__dict__)
+        state._undo_log = []
+        self._robots_shared = state._robots_shared = True
+        return state
+
     def is_robot(self, loc):
         return loc in self.robots
 
+    # yields (loc, hp, player_id, robot_id) for every robot on the board
+    def _iter_robots(self):
+        for loc, robot in self.robots.iteritems():
+            yield loc, robot.hp, robot.player_id, robot.robot_id
+
     def _get_spawn_locations(self):
         # see http://stackoverflow.com/questions/2612648/reservoir-sampling
+        stream = self._random.stream(self.turn, counterrandom.SPAWN)
         locations = []
         per_player = self._settings.spawn_per_player
         count = per_player * 2
@@ -60,7 +183,7 @@ class GameState(object):
             if len(locations) < count:
                 locations.append(loc)
             else:
-                s = int(self._spawn_random.random() * n)
+                s = int(stream.random(n) * n)
                 if s < count:
                     locations[s] = loc
 
@@ -68,128 +191,94 @@ class GameState(object):
 
     # actions = {loc: action}
     # all actions must be valid
-    # delta = [AttrDict{
-    #    'loc': loc,
-    #    'hp': hp,
-    #    'player_id': player_id,
-    #    'loc_end': loc_end,
-    #    'hp_end': hp_end
-    # }]
-    def get_delta(self, actions, spawn=True):
-        delta = []
-
-        def dest(loc):
-            if actions[loc][0] == 'move':
-                return actions[loc][1]
-            else:
-                return loc
-
-        hitpoints = defaultdict(lambda: set())
+    # attack_damage = [damage by player 0, damage by player 1] replaces the
+    # random attack damage if given
+    # returns [(loc, hp, player_id, robot_id, loc_end, hp_end)], with hp 0
+    # and robot_id None for robots that are about to spawn
+    def _get_changes(self, actions, spawn=True, attack_damage=None):
+        settings = self._settings
+        topology = settings.topology
 
-        def stuck(loc):
-            # we are not moving anywhere
-            # inform others
-            old_hitpoints = hitpoints[loc]
-            hitpoints[loc] = set([loc])
+        robots = list(self._iter_robots())
+        owner = dict((loc, player_id) for loc, _, player_id, _ in robots)
 
-            for rival in old_hitpoints:
-                if rival != loc:
-                    stuck(rival)
-
-        for loc in self.robots:
-            hitpoints[dest(loc)].add(loc)
-
-        for loc in self.robots:
-            if len(hitpoints[dest(loc)]) > 1 or (self.is_robot(dest(loc)) and
-                                                 dest(loc) != loc and
-                                                 dest(dest(loc)) == loc):
-                # we've got a problem
-                stuck(loc)
-
-        # calculate new locations
-        for loc, robot in self.robots.iteritems():
-            if actions[loc][0] == 'move' and loc in hitpoints[loc]:
-                new_loc = loc
-            else:
-                new_loc = dest(loc)
-
-            delta.append(AttrDict({
-                'loc': loc,
-                'hp': robot.hp,
-                'player_id': robot.player_id,
-                'loc_end': new_loc,
-                'hp_end': robot.hp  # will be adjusted later
-            }))
-
-        # {loc: set(robots collided with loc}
-        collisions = defaultdict(lambda: set())
-        for loc in self.robots:
-            for loc2 in hitpoints[dest(loc)]:
-                collisions[loc].add(loc2)
-                collisions[loc2].add(loc)
+        loc_ends, collisions = resolve_moves(owner, actions)
 
         # {loc: [damage_dealt_by_player_0, damage_dealt_by_player_1]}
         damage_map = defaultdict(lambda: [0, 0])
 
-        for loc, robot in self.robots.iteritems():
-            actor_id = robot.player_id
-
+        attack_stream = self._random.stream(self.turn, counterrandom.ATTACK)
+        for loc, _, actor_id, robot_id in robots:
             if actions[loc][0] == 'attack':
                 target = actions[loc][1]
-                damage = self._attack_random.randint(
-                    *self._settings.attack_range)
+                if attack_damage is None:
+                    damage = attack_stream.randint(
+                        robot_id, *settings.attack_range)
+                else:
+                    damage = attack_damage[actor_id]
                 damage_map[target][actor_id] += damage
 
             if actions[loc][0] == 'suicide':
-                damage_map[loc][1 - actor_id] += self._settings.robot_hp
+                damage_map[loc][1 - actor_id] += settings.robot_hp
 
-                damage = self._settings.suicide_damage
-                for target in rg.locs_around(loc):
+                damage = settings.suicide_damage
+                for target in topology.locs_around(loc):
                     damage_map[target][actor_id] += damage
 
-        # apply damage
-        for delta_info in delta:
-            loc = delta_info.loc
-            loc_end = delta_info.loc_end
-            robot = self.robots[loc]
+        spawning = spawn and self.turn % settings.spawn_every == 0
+        no_damage = (0, 0)
 
-            # apply collision damage
-            if actions[loc][0] != 'guard':
-                damage = self._settings.collision_damage
+        changes = []
+        for loc, hp, player_id, robot_id in robots:
+            action = actions[loc][0]
+            loc_end = loc_ends[loc]
+            hp_end = hp
 
-                for loc2 in collisions[delta_info.loc]:
-                    if robot.player_id != self.robots[loc2].player_id:
-                        delta_info.hp_end -= damage
+            # apply collision damage
+            if action != 'guard':
+                for loc2 in collisions[loc]:
+                    if player_id != owner[loc2]:
+                        hp_end -= settings.collision_damage
 
             # apply other damage
-            damage_taken = damage_map[loc_end][1 - robot.player_id]
-            if actions[loc][0] == 'guard':
+            damage_taken = damage_map.get(loc_end, no_damage)[1 - player_id]
+            if action == 'guard':
                 damage_taken /= 2
+            hp_end -= damage_taken
 
-            delta_info.hp_end -= damage_taken
+            # clear bots on spawn
+            if spawning and topology.cell_type(loc_end) & rg.SPAWN:
+                hp_end = 0
 
-        if spawn:
-            if self.turn % self._settings.spawn_every == 0:
-                # clear bots on spawn
-                for delta_info in delta:
-                    loc_end = delta_info.loc_end
+            changes.append((loc, hp, player_id, robot_id, loc_end, hp_end))
 
-                    if loc_end in self._settings.spawn_coords:
-                        delta_info.hp_end = 0
+        if spawning:
+            locations = self._get_spawn_locations()
+            for player_id, locs in enumerate(locations):
+                for loc in locs:
+                    changes.append((loc, 0, player_id, None, loc,
+                                    settings.robot_hp))
 
-                # spawn bots
-                locations = self._get_spawn_locations()
-                for player_id, locs in enumerate(locations):
-                    for loc in locs:
-                        delta.append(AttrDict({
-                            'loc': loc,
-                            'hp': 0,
-                            'player_id': player_id,
-                            'loc_end': loc,
-                            'hp_end': self._settings.robot_hp
-                        }))
+        return changes
 
-        return delta
+    # actions = {loc: action}
+    # all actions must be valid
+    # delta = [AttrDict{
+    #    'loc': loc,
+    #    'hp': hp,
+    #    'player_id': player_id,
+    #    'loc_end': loc_end,
+    #    'hp_end': hp_end
+    # }]
+    def get_delta(self, actions, spawn=True):
+        return [AttrDict({
+            'loc': loc,
+            'hp': hp,
+            'player_id': player_id,
+            'loc_end': loc_end,
+            'hp_end': hp_end
+        }) for loc, hp, player_id, _, loc_end, hp_end in self._get_changes(
+            actions, spawn)]
 
     # delta = [AttrDict{
     #    'loc': loc,
@@ -200,10 +289,11 @@ class GameState(object):
     # }]
     # returns new GameState
     def apply_delta(self, delta):
-        new_state = GameState(self._settings,
-                              next_robot_id=self._next_robot_id,
-                              turn=self.turn + 1,
-                              seed=self._spawn_random.randint(0, sys.maxint))
+        new_state = self.__class__(
+            self._settings,
+            next_robot_id=self._next_robot_id,
+            turn=self.turn + 1,
+            seed=self._random.seed)
 
         for delta_info in delta:
             if delta_info.hp_end > 0:
@@ -228,6 +318,52 @@ class GameState(object):
 
         return self.apply_delta(delta)
 
+    # removes the robot on loc, returning what _restore needs to put it back
+    def _lift(self, loc):
+        self._own_robots()
+        return self.robots.pop(loc)
+
+    def _restore(self, loc, robot):
+        self._own_robots()
+        self.robots[loc] = robot
+
+    # applies actions to this state in place, moving it to the next turn;
+    # undo() reverts the most recent apply
+    def apply(self, actions, spawn=True):
+        self._apply_changes(self._get_changes(actions, spawn))
+
+    def _apply_changes(self, changes):
+        turn = self.turn
+        next_robot_id = self._next_robot_id
+
+        # lift every robot that moves, changes or dies off the board first,
+        # robots that stay as they are keep their place
+        lifted = []
+        for loc, hp, _, _, loc_end, hp_end in changes:
+            if hp > 0 and (loc_end != loc or hp_end != hp):
+                lifted.append((loc, self._lift(loc)))
+
+        added = []
+        for loc, hp, player_id, robot_id, loc_end, hp_end in changes:
+            if hp_end > 0 and (loc_end != loc or hp_end != hp):
+                # robot_id is None for new robots
+                self.add_robot(loc_end, player_id, hp_end, robot_id)
+                added.append(loc_end)
+
+        self._undo_log.append((turn, next_robot_id, lifted, added))
+        self.turn += 1
+
+    def undo(self):
+        turn, next_robot_id, lifted, added = self._undo_log.pop()
+
+        for loc in added:
+            self.remove_robot(loc)
+        for loc, robot in lifted:
+            self._restore(loc, robot)
+
+        self.turn = turn
+        self._next_robot_id = next_robot_id
+
     def get_scores(self):
         scores = [0, 0]
 
@@ -237,19 +373,74 @@ class GameState(object):
         return scores
 
     # export GameState to be used by a robot
+    # game_info.robots = {loc: RobotInfo}, a copy made for player_id
     def get_game_info(self, player_id):
         game_info = AttrDict()
 
-        game_info.robots = dict((loc, AttrDict(robot))
-                                for loc, robot in self.robots.iteritems())
-        for robot in game_info.robots.itervalues():
-            if robot.player_id != player_id:
-                del robot.robot_id
-
+        # robot_info inlined, this runs for every player and turn
+        robots = {}
+        set_dict = object.__setattr__
+        for loc, robot in self.robots.iteritems():
+            if robot.player_id == player_id:
+                info = RobotInfo(location=loc, hp=robot.hp,
+                                 player_id=player_id,
+                                 robot_id=robot.robot_id)
+            else:
+                info = RobotInfo(location=loc, hp=robot.hp,
+                                 player_id=robot.player_id)
+            set_dict(info, '__dict__', info)
+            robots[loc] = info
+        game_info.robots = robots
         game_info.turn = self.turn
+        # over a copy, so that bots cannot reach the live state through it
+        game_info.simulate = functools.partial(
+            simulate_copy, self.__class__, self._settings, self.turn, robots,
+            player_id)
 
         return game_info
 
+    # predicts the next turn as player_id, for game_info.simulate
+    # my_actions = {loc: action} for player_id's robots
+    # enemy_policy = {loc: action} for the enemy's robots, or a function
+    # taking the game_info of player_id and returning that
+    # damage = 'expected' for the mean attack damage, or 'worst' for the
+    # weakest attacks by player_id and the strongest by the enemy
+    # missing and invalid actions are guards, and robots that would spawn are
+    # left out so as not to reveal spawn locations
+    # returns the game_info of player_id for the predicted state
+    def simulate(self, player_id, my_actions, enemy_policy=None,
+                 damage='expected'):
+        low, high = self._settings.attack_range
+        if damage == 'expected':
+            attack_damage = [(low + high) / 2.0] * 2
+        elif damage == 'worst':
+            attack_damage = [high, high]
+            attack_damage[player_id] = low
+        else:
+            raise ValueError('damage must be expected or worst, not {0}'
+                             .format(damage))
+
+        if callable(enemy_policy):
+            enemy_policy = enemy_policy(self.get_game_info(player_id))
+
+        actions = {}
+        for loc, robot in self.robots.iteritems():
+            if robot.player_id == player_id:
+                action = my_actions.get(loc)
+            elif enemy_policy is not None:
+                action = enemy_policy.get(loc)
+            else:
+                action = None
+            if action is None or not self.is_valid_action(loc, action):
+                action = ['guard']
+            actions[loc] = action
+
+        state = self.fork()
+        changes = state._get_changes(actions, attack_damage=attack_damage)
+        state._apply_changes([change for change in changes
+                              if change[3] is not None])
+        return state.get_game_info(player_id)
+
     # actor = location
     # action = well, action
     def is_valid_action(self, actor, action):
@@ -261,8 +452,8 @@ class GameState(object):
                 return False
 
             if action[0] in ['move', 'attack']:
-                return action[1] in rg.locs_around(
-                    actor, filter_out=['invalid', 'obstacle'])
+                return action[1] in self._settings.topology.locs_around(
+                    actor, rg.INVALID | rg.OBSTACLE)
             elif action[0] in ['guard', 'suicide']:
                 return True
             else:
@@ -0,0 +1,363 @@
+#!/usr/bin/env python2
+'''
+Renders recorded games to PNG frames or animated GIFs, without Tk.
+
+Every turn of a history (Game.history, or a replay file, see rgkit.replay)
+becomes one palette image, rasterized in pure Python: the board is drawn
+once, and each frame is a copy of it with the robots, their hp and their
+move and attack arrows on top. Frames are encoded in the worker processes
+of make_pool, so that many games can be rendered on a server without a
+display.
+'''
+import argparse
+from argparse import RawTextHelpFormatter
+import multiprocessing
+import os
+import struct
+import zlib
+
+from rgkit import game
+from rgkit.replay import ReplayReader
+from rgkit.render.utils import compute_color
+
+# 3x5 digits, one string of '#' and '.' per row
+FONT = {
+    '0': ('###', '#.#', '#.#', '#.#', '###'),
+    '1': ('.#.', '##.', '.#.', '.#.', '###'),
+    '2': ('###', '..#', '###', '#..', '###'),
+    '3': ('###', '..#', '###', '..#', '###'),
+    '4': ('#.#', '#.#', '###', '..#', '..#'),
+    '5': ('###', '#..', '###', '..#', '###'),
+    '6': ('###', '#..', '###', '#.#', '###'),
+    '7': ('###', '..#', '.#.', '.#.', '.#.'),
+    '8': ('###', '#.#', '###', '#.#', '###'),
+    '9': ('###', '#.#', '###', '..#', '###'),
+}
+
+GAP_COLOR = (0x55, 0x55, 0x55)
+MOVE_COLOR = (0xad, 0xd8, 0xe6)  # lightblue, as in render.RobotSprite
+ATTACK_COLOR = (0xff, 0xa5, 0x00)  # orange
+
+parser = argparse.ArgumentParser(
+    description="Render replays to PNG frames or animated GIFs.",
+    formatter_class=RawTextHelpFormatter)
+parser.add_argument("replays", nargs='+', metavar="REPLAY",
+                    help="Replay files, see rgkit.replay.")
+parser.add_argument("-m", "--map",
+                    help="Map the games were played on.",
+                    default="default")
+parser.add_argument("-o", "--output", default=".", metavar="DIR",
+                    help="Directory for the output, default: .")
+parser.add_argument("--gif", action="store_true", default=False,
+                    help="Write one animated GIF per replay instead of a\n\
+directory of PNG frames.")
+parser.add_argument("-b", "--block-size", type=int, default=16,
+                    help="Pixels per board cell, default: 16")
+parser.add_argument("--turns", type=int, nargs='*', metavar="TURN",
+                    help="Only render these turns, e.g. the last one for a\n\
+thumbnail.")
+parser.add_argument("--no-arrows", action="store_true", default=False,
+                    help="Do not draw move and attack arrows.")
+parser.add_argument("-j", "--processes", type=int,
+                    help="Worker processes, default: one per CPU.")
+
+
+def to_rgb(color):
+    return tuple(int(max(0, min(c, 1)) * 255) for c in color)
+
+
+class FrameRenderer(object):
+    '''
+    Draws turns of a history as bytearrays of palette indices, one byte per
+    pixel, row by row.
+    '''
+
+    def __init__(self, settings, block_size=16, arrows=True):
+        self.block_size = block_size
+        self.border = max(block_size // 12, 1)
+        self.scale = max(block_size // 12, 1)
+        self.arrows = arrows
+        self.width = self.height = settings.board_size * block_size
+        self._robot_hp = settings.robot_hp
+
+        self.palette = []
+        self._index = {}
+        gap = self._add_color(GAP_COLOR)
+        normal = self._add_color(to_rgb(settings.normal_color))
+        obstacle = self._add_color(to_rgb(settings.obstacle_color))
+        self._bright = self._add_color(to_rgb(settings.text_color_bright))
+        self._dark = self._add_color(to_rgb(settings.text_color_dark))
+        self._move = self._add_color(MOVE_COLOR)
+        self._attack = self._add_color(ATTACK_COLOR)
+        # {(player_id, hp): index}, hp above 50 looks like 50
+        self._robot_colors = {}
+        for player_id in xrange(len(settings.colors)):
+            for hp in xrange(min(settings.robot_hp, 50) + 1):
+                self._robot_colors[player_id, hp] = self._add_color(
+                    to_rgb(compute_color(settings, player_id, hp)))
+
+        self.background = bytearray(chr(gap) * (self.width * self.height))
+        for x in xrange(settings.board_size):
+            for y in xrange(settings.board_size):
+                self._fill_cell(self.background, (x, y),
+                                obstacle if (x, y) in settings.obstacles
+                                else normal)
+
+    def _add_color(self, color):
+        if color not in self._index:
+            self._index[color] = len(self.palette)
+            self.palette.append(color)
+        return self._index[color]
+
+    def _fill(self, pixels, x0, y0, x1, y1, index):
+        row = chr(index) * (x1 - x0)
+        for y in xrange(y0, y1):
+            start = y * self.width + x0
+            pixels[start:start + len(row)] = row
+
+    def _fill_cell(self, pixels, loc, index):
+        x, y = loc[0] * self.block_size, loc[1] * self.block_size
+        size = self.block_size - self.border
+        self._fill(pixels, x, y, x + size, y + size, index)
+
+    # a line of the arrow's width between the centers of two cells
+    def _draw_arrow(self, pixels, loc, target, index):
+        half = (self.block_size - self.border) // 2
+        width = max(self.block_size // 8, 1)
+        (x0, x1), (y0, y1) = [
+            sorted((a * self.block_size + half, b * self.block_size + half))
+            for a, b in zip(loc, target)]
+        self._fill(pixels, x0 - width // 2, y0 - width // 2,
+                   x1 - width // 2 + width, y1 - width // 2 + width, index)
+
+    def _draw_text(self, pixels, loc, text, index):
+        scale = self.scale
+        width = (len(text) * 4 - 1) * scale
+        cell = self.block_size - self.border
+        if width > cell:
+            return
+        left = loc[0] * self.block_size + (cell - width) // 2
+        top = loc[1] * self.block_size + (cell - 5 * scale) // 2
+        for i, char in enumerate(text):
+            for row, line in enumerate(FONT[char]):
+                for column, dot in enumerate(line):
+                    if dot == '#':
+                        x = left + (i * 4 + column) * scale
+                        y = top + row * scale
+                        self._fill(pixels, x, y, x + scale, y + scale, index)
+
+    # robots = one entry of Game.history
+    def render(self, robots):
+        pixels = bytearray(self.background)
+        for robot in robots:
+            hp = max(robot['hp'], 0)
+            self._fill_cell(pixels, robot['location'],
+                            self._robot_colors[robot['player_id'],
+                                               min(hp, 50)])
+
+        if self.arrows:
+            for robot in robots:
+                action = robot.get('action')
+                if action is not None and action[0] in ('move', 'attack'):
+                    self._draw_arrow(pixels, robot['location'], action[1],
+                                     self._move if action[0] == 'move'
+                                     else self._attack)
+
+        for robot in robots:
+            hp = max(robot['hp'], 0)
+            self._draw_text(pixels, robot['location'], str(hp),
+                            self._bright if hp > self._robot_hp / 2
+                            else self._dark)
+        return pixels
+
+    def png(self, robots):
+        return encode_png(self.render(robots), self.width, self.height,
+                          self.palette)
+
+    # delay in hundredths of a second
+    def gif_frame(self, robots, delay):
+        return encode_gif_frame(self.render(robots), self.width, self.height,
+                                delay, self.palette)
+
+
+def _png_chunk(kind, data):
+    return (struct.pack('>I', len(data)) + kind + data +
+            struct.pack('>I', zlib.crc32(kind + data) & 0xffffffff))
+
+
+def encode_png(pixels, width, height, palette):
+    rows = ''.join('\0' + str(pixels[y * width:(y + 1) * width])
+                   for y in xrange(height))
+    return ''.join([
+        '\x89PNG\r\n\x1a\n',
+        # 8 bit palette indices
+        _png_chunk('IHDR', struct.pack('>IIBBBBB', width, height, 8, 3,
+                                       0, 0, 0)),
+        _png_chunk('PLTE', ''.join(struct.pack('BBB', *color)
+                                   for color in palette)),
+        _png_chunk('IDAT', zlib.compress(rows)),
+        _png_chunk('IEND', ''),
+    ])
+
+
+# bits per palette index; GIF color tables have 2 ** bits entries
+def _gif_bits(palette):
+    bits = 1
+    while len(palette) > 1 << bits:
+        bits += 1
+    return bits
+
+
+def gif_header(width, height, palette):
+    bits = _gif_bits(palette)
+    table = ''.join(struct.pack('BBB', *color) for color in palette)
+    table += '\0' * (3 * (1 << bits) - len(table))
+    return ''.join([
+        'GIF89a',
+        struct.pack('<HHBBB', width, height, 0xf0 | (bits - 1), 0, 0),
+        table,
+        # loop forever
+        '!\xff\x0bNETSCAPE2.0\x03\x01\x00\x00\x00',
+    ])
+
+
+def _lzw(pixels, min_code_size):
+    clear = 1 << min_code_size
+    out = bytearray()
+    state = [0, 0]  # bit buffer, bits in it
+
+    def emit(code, size):
+        buf = state[0] | code << state[1]
+        bits = state[1] + size
+        while bits >= 8:
+            out.append(buf & 0xff)
+            buf >>= 8
+            bits -= 8
+        state[0], state[1] = buf, bits
+
+    code_size = min_code_size + 1
+    emit(clear, code_size)
+    table = {}
+    next_code = clear + 2
+    prefix = pixels[0]
+    for pixel in pixels[1:]:
+        code = table.get((prefix, pixel))
+        if code is not None:
+            prefix = code
+            continue
+
+        emit(prefix, code_size)
+        if next_code < 4096:
+            table[prefix, pixel] = next_code
+            if next_code == 1 << code_size:
+                code_size += 1
+            next_code += 1
+        else:
+            emit(clear, code_size)
+            table = {}
+            next_code = clear + 2
+            code_size = min_code_size + 1
+        prefix = pixel
+
+    emit(prefix, code_size)
+    emit(clear + 1, code_size)
+    if state[1]:
+        out.append(state[0])
+    return str(out)
+
+
+def encode_gif_frame(pixels, width, height, delay, palette):
+    min_code_size = max(_gif_bits(palette), 2)
+    data = _lzw(pixels, min_code_size)
+    blocks = ''.join(chr(len(data[i:i + 255])) + data[i:i + 255]
+                     for i in xrange(0, len(data), 255))
+    return ''.join([
+        '!\xf9\x04\x00' + struct.pack('<H', delay) + '\x00\x00',
+        ',' + struct.pack('<HHHHB', 0, 0, width, height, 0),
+        chr(min_code_size), blocks, '\0',
+    ])
+
+
+_worker_renderer = None
+
+
+def _init_worker(renderer):
+    global _worker_renderer
+    _worker_renderer = renderer
+
+
+def _encode_frame(data):
+    robots, delay = data
+    if delay is None:
+        return _worker_renderer.png(robots)
+    return _worker_renderer.gif_frame(robots, delay)
+
+
+# worker processes that render with renderer, for the pool arguments below
+def make_pool(renderer, processes=None):
+    return multiprocessing.Pool(processes, _init_worker, (renderer,))
+
+
+# yields the encoded frames of the turns of history in order: PNG files,
+# or GIF frames shown for delay hundredths of a second if delay is given;
+# without a pool, they are rendered in this process
+def encode_frames(history, renderer, pool=None, delay=None):
+    tasks = ((robots, delay) for robots in history)
+    if pool is None:
+        _init_worker(renderer)
+        return (_encode_frame(data) for data in tasks)
+    return pool.imap(_encode_frame, tasks)
+
+
+# turns = the turn number of each entry of history, for the file names
+def save_pngs(history, renderer, directory, pool=None, turns=None):
+    if turns is None:
+        turns = xrange(len(history))
+    if not os.path.isdir(directory):
+        os.makedirs(directory)
+    frames = encode_frames(history, renderer, pool)
+    for turn, png in zip(turns, frames):
+        with open(os.path.join(directory, 'turn{0:03d}.png'.format(turn)),
+                  'wb') as f:
+            f.write(png)
+
+
+def save_gif(history, renderer, fname, pool=None, delay=None):
+    if delay is None:
+        delay = max(game.settings.turn_interval // 10, 1)
+    with open(fname, 'wb') as f:
+        f.write(gif_header(renderer.width, renderer.height, renderer.palette))
+        for frame in encode_frames(history, renderer, pool, delay):
+            f.write(frame)
+        f.write(';')
+
+
+def main():
+    args = parser.parse_args()
+    settings = game.init_settings(args.map)
+    renderer = FrameRenderer(settings, args.block_size, not args.no_arrows)
+    pool = make_pool(renderer, args.processes)
+
+    try:
+        for fname in args.replays:
+            replay = ReplayReader(fname)
+            if args.turns:
+                history = [replay[turn] for turn in args.turns]
+            else:
+                history = list(replay)
+            replay.close()
+
+            name = os.path.splitext(os.path.basename(fname))[0]
+            if args.gif:
+                save_gif(history, renderer,
+                         os.path.join(args.output, name + '.gif'), pool)
+            else:
+                save_pngs(history, renderer,
+                          os.path.join(args.output, name), pool, args.turns)
+    finally:
+        pool.close()
+        pool.join()
+
+
+if __name__ == '__main__':
+    main()
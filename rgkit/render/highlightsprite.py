@@ -1,5 +1,4 @@
-from rgkit.render.robotsprite import compute_color
-from rgkit.render.utils import rgb_to_hex, blend_colors
+from rgkit.render.utils import rgb_to_hex, blend_colors, compute_color
 
 
 class HighlightSprite(object):
@@ -1,5 +1,6 @@
 import Tkinter
 import math
+import time
 
 from rgkit.render.robotsprite import RobotSprite
 from rgkit.render.highlightsprite import HighlightSprite
@@ -7,9 +8,15 @@ from rgkit.render.utils import millis, rgb_to_hex
 
 
 class Render(object):
-    def __init__(self, game_inst, settings, animations, names=["Red", "Blue"]):
+    # profile = game.Profile that gets the time spent drawing as 'rendering'
+    def __init__(self, game_inst, settings, animations, names=["Red", "Blue"],
+                 profile=None):
         self.size_changed = False
-        self.init = True
+        self._t_resized = 0
+
+        # the pending callback, see schedule
+        self._after_id = None
+        self._t_wakeup = 0
 
         self.cell_border_width = 2
         self.info_frame_height = 80
@@ -24,6 +31,8 @@ class Render(object):
         self._paused = True
         self._names = names
         self._layers = {}
+        self._profile = profile
+        start = time.time()
 
         self._master = Tkinter.Tk()
         self._master.configure(background="#333")
@@ -77,9 +86,18 @@ class Render(object):
         self._highlighted = None
         self._highlighted_target = None
 
+        # canvas items that are hidden and can be reused, by item type,
+        # see create_item and remove_object
+        self._item_pool = {}
+        self._item_types = {}
+
         # Animation stuff (also see #render heading in settings.py)
-        self._sprites = []
+        # {robot_id, or ('spawn', loc) for robots spawning: RobotSprite}
+        self._sprites = {}
+        # the sprites that look different at every subframe
+        self._animated = []
         self._highlight_sprite = None
+        self._highlight_shown = False
         self._t_frame_start = 0
         self._t_next_frame = 0
         self._t_cursor_start = 0
@@ -90,6 +108,7 @@ class Render(object):
         self.update_info_frame()
         self.update_sprites_new_turn()
         self.paint()
+        self.add_render_time(start)
 
         self.callback()
 
@@ -97,10 +116,35 @@ class Render(object):
 
     def on_resize(self, event):
         self.size_changed = True
+        self._t_resized = millis()
+        self.schedule(self._settings.resize_delay)
 
+    # hides a canvas item made by create_item, to be handed out again
     def remove_object(self, obj):
-        if obj is not None:
+        if obj is None:
+            return
+        item_type = self._item_types.get(obj)
+        if item_type is None:
             self._win.delete(obj)
+        else:
+            self._win.itemconfig(obj, state=Tkinter.HIDDEN)
+            self._item_pool[item_type].append(obj)
+
+    # like self._win.create_<item_type>, but reuses a removed item if there
+    # is one
+    def create_item(self, item_type, coords, **kargs):
+        pool = self._item_pool.setdefault(item_type, [])
+        if pool:
+            item = pool.pop()
+            self._win.coords(item, coords)
+            self._win.itemconfig(item, state=Tkinter.NORMAL, **kargs)
+            # on top, like a new item
+            self._win.tag_raise(item)
+            return item
+
+        item = getattr(self._win, 'create_' + item_type)(coords, **kargs)
+        self._item_types[item] = item_type
+        return item
 
     def turn_changed(self):
         if self._settings.clear_highlight_between_turns:
@@ -110,29 +154,33 @@ class Render(object):
         self.update_sprites_new_turn()
         self.update_info_frame()
 
+    # resizes the board once the window has not been resized for
+    # settings.resize_delay, moving the existing canvas items
     def update_block_size(self):
-        if self.size_changed:
-            if self.init:
-                self.init = False
-                return
-
-            self.size_changed = False
-            self._win.delete("all")
-
-            self._winsize = min(self._board_frame.winfo_width(),
-                                self._board_frame.winfo_height())
-            self._winsize = max(min(self._winsize,
-                                    self._master.winfo_height() -
-                                    self.info_frame_height),
-                                250)
-
-            self._blocksize = ((self._winsize - self.board_margin) /
-                               self._settings.board_size)
-            self._win.configure(width=self._winsize, height=self._winsize)
+        if (not self.size_changed or
+                millis() - self._t_resized < self._settings.resize_delay):
+            return
+        self.size_changed = False
 
-            self.draw_background()
-            self.update_sprites_new_turn()
-            self.paint()
+        winsize = min(self._board_frame.winfo_width(),
+                      self._board_frame.winfo_height())
+        winsize = max(min(winsize,
+                          self._master.winfo_height() -
+                          self.info_frame_height),
+                      250)
+        blocksize = ((winsize - self.board_margin) /
+                     self._settings.board_size)
+        if winsize == self._winsize and blocksize == self._blocksize:
+            return
+
+        self._winsize = winsize
+        self._blocksize = blocksize
+        self._win.configure(width=self._winsize, height=self._winsize)
+
+        self.resize_background()
+        # arrows are only drawn once per turn
+        self.update_sprites_new_turn()
+        self.paint()
 
     def step_turn(self, turns):
         self._turn = self.current_turn_int() + turns
@@ -153,6 +201,7 @@ class Render(object):
             self._sub_turn = 0.0
         else:
             self.update_frame_start_time(now)
+            self.schedule(0)
 
     def update_frame_start_time(self, tstart=None):
         tstart = tstart or millis()
@@ -195,9 +244,10 @@ class Render(object):
                     self._highlighted_target = action.get("target", None)
                 else:
                     self._highlighted_target = None
+                self._t_cursor_start = millis()
                 self.update_highlight_sprite(True)
                 self.update_info_frame()
-                self._t_cursor_start = millis()
+                self.schedule(0)
 
         self._win.bind("<Button-1>", lambda e: onclick(e))
         self._master.bind('<Left>', lambda e: prev())
@@ -232,7 +282,8 @@ class Render(object):
             to_=self._settings.turn_interval / 2,
             orient=Tkinter.HORIZONTAL,
             borderwidth=0,
-            length=90)
+            length=90,
+            command=lambda value: self.schedule(0))
         self._time_slider.pack(fill=Tkinter.X)
         self._time_slider.set(0)
 
@@ -245,13 +296,9 @@ class Render(object):
         x, y = self.grid_to_xy(loc)
         rx, ry = self.square_bottom_corner((x, y))
         if type == "square" or self._settings.bot_shape == "square":
-            item = self._win.create_rectangle(
-                x, y, rx, ry,
-                **kargs)
+            item = self.create_item('rectangle', (x, y, rx, ry), **kargs)
         elif type == "circle":
-            item = self._win.create_oval(
-                x, y, rx, ry,
-                **kargs)
+            item = self.create_item('oval', (x, y, rx, ry), **kargs)
         return item
 
     def update_layers(self):
@@ -262,9 +309,10 @@ class Render(object):
         layer_id = 'layer %d' % 9
         self._layers[layer_id] = None
         x, y = self.grid_to_xy(loc)
-        item = self._win.create_text(
-            x + (self._blocksize - self.cell_border_width) / 2,
-            y + (self._blocksize - self.cell_border_width) / 2,
+        item = self.create_item(
+            'text',
+            (x + (self._blocksize - self.cell_border_width) / 2,
+             y + (self._blocksize - self.cell_border_width) / 2),
             text=text, font='TkFixedFont', fill=color, tags=[layer_id])
         return item
 
@@ -278,8 +326,8 @@ class Render(object):
         srcx, srcy = self.grid_to_xy(src)
         dstx, dsty = self.grid_to_xy(dst)
 
-        item = self._win.create_line(
-            srcx + ox, srcy + oy, dstx + ox, dsty + oy, **kargs)
+        item = self.create_item(
+            'line', (srcx + ox, srcy + oy, dstx + ox, dsty + oy), **kargs)
         return item
 
     def update_info_frame(self):
@@ -317,38 +365,93 @@ class Render(object):
             v = v * 20
         self._slider_delay = self._settings.turn_interval + v
 
+    def add_render_time(self, start):
+        if self._profile is not None:
+            self._profile.add('rendering', time.time() - start)
+
+    # runs callback in delay milliseconds, unless it is due sooner anyway
+    def schedule(self, delay):
+        wakeup = millis() + delay
+        if self._after_id is not None:
+            if self._t_wakeup <= wakeup:
+                return
+            self._win.after_cancel(self._after_id)
+        self._t_wakeup = wakeup
+        self._after_id = self._win.after(int(max(delay, 0)), self.callback)
+
     def callback(self):
+        self._after_id = None
+        start = time.time()
         self.update_slider_value()
         self.tick()
-        self._win.after(int(1000.0 / self._settings.FPS), self.callback)
-
+        self.add_render_time(start)
+
+        delay = self.next_frame_delay(millis())
+        if delay is not None:
+            self.schedule(delay)
+
+    # milliseconds until something needs to be drawn again, or None if
+    # nothing will change until the user does something
+    def next_frame_delay(self, now):
+        delays = []
+        if not self._paused:
+            if self._animations:
+                delays.append(1000.0 / self._settings.FPS)
+            else:
+                delays.append(self._t_next_frame - now)
+        elif self.is_blinking():
+            rate = self._settings.rate_cursor_blink
+            shown_for = self._settings.highlight_cursor_blink_interval * rate
+            t = (now - self._t_cursor_start) % rate
+            delays.append(shown_for - t if t < shown_for else rate - t)
+        if self.size_changed:
+            delays.append(self._settings.resize_delay -
+                          (now - self._t_resized))
+        if delays:
+            return max(min(delays), 1)
+        return None
+
+    def is_blinking(self):
+        return (self._animations and
+                self._settings.highlight_cursor_blink and
+                self._highlighted is not None)
+
+    def blink_subframe(self, now):
+        subframe_t = ((now - self._t_cursor_start) %
+                      self._settings.rate_cursor_blink)
+        return float(subframe_t) / self._settings.rate_cursor_blink
+
+    # only draws what changed since the last frame
     def tick(self):
         now = millis()
-
-        # check if frame-update
-        if self._animations:
-            if not self._paused:
-                self._sub_turn = max(0.0,
-                                     float((now - self._t_frame_start)) /
-                                     float(self._slider_delay))
+        subframe_hlt = self.blink_subframe(now) if self._animations else 0
+
+        if not self._paused:
+            # turns that are already over by now are skipped
+            turns, elapsed = divmod(now - self._t_frame_start,
+                                    self._slider_delay)
+            if turns > 0:
+                self._turn = min(self._turn + turns, self._settings.max_turns)
+                self.update_frame_start_time(
+                    self._t_frame_start + turns * self._slider_delay)
                 if self._turn >= self._settings.max_turns:
                     self.toggle_pause()
-                    self._turn = self._settings.max_turns
-                self.update_info_frame()
-                if self._sub_turn >= 1:
-                    self._sub_turn -= 1
-                    self._turn += 1
-                    self.update_frame_start_time(self._t_next_frame)
-                    self.turn_changed()
-            subframe_t = ((now - self._t_cursor_start) %
-                          self._settings.rate_cursor_blink)
-            subframe_hlt = float(subframe_t) / self._settings.rate_cursor_blink
-            self.paint(self._sub_turn, subframe_hlt)
-        elif now > self._t_next_frame and not self._paused:
-            self._turn += 1
-            self.update_frame_start_time(self._t_next_frame)
-            self.turn_changed()
-            self.paint(0, 0)
+                self.turn_changed()
+
+            if self._animations and not self._paused:
+                self._sub_turn = float(elapsed) / self._slider_delay
+
+            if turns > 0:
+                self.paint(self._sub_turn, subframe_hlt)
+            elif self._animations:
+                for sprite in self._animated:
+                    sprite.animate(self._sub_turn)
+
+        if self.is_blinking():
+            shown = (subframe_hlt <
+                     self._settings.highlight_cursor_blink_interval)
+            if shown != self._highlight_shown:
+                self.paint_highlight_sprite(subframe_hlt)
 
         self.update_block_size()
 
@@ -357,29 +460,62 @@ class Render(object):
             return rgb_to_hex(*self._settings.obstacle_color)
         return rgb_to_hex(*self._settings.normal_color)
 
+    # the board is drawn once; resize_background moves it to a new
+    # block size
     def draw_background(self):
+        self._background = []
         # draw squares
         for y in range(self._settings.board_size):
             for x in range(self._settings.board_size):
                 loc = (x, y)
-                self.draw_grid_object(
-                    loc, fill=self.get_bg_color(loc), layer=1, width=0)
+                item = self.draw_grid_object(
+                    loc, fill=self.get_bg_color(loc), layer=1, width=0,
+                    tags=['background'])
+                self._background.append((item, loc, False))
         # draw text labels
         text_color = rgb_to_hex(*self._settings.text_color)
         for y in range(self._settings.board_size):
-            self.draw_text((y, 0), str(y), color=text_color)
-            self.draw_text((0, y), str(y), color=text_color)
-
+            for loc in ((y, 0), (0, y)):
+                item = self.draw_text(loc, str(y), color=text_color)
+                self._background.append((item, loc, True))
+
+    def resize_background(self):
+        for item, loc, is_text in self._background:
+            x, y = self.grid_to_xy(loc)
+            if is_text:
+                self._win.coords(
+                    item,
+                    x + (self._blocksize - self.cell_border_width) / 2,
+                    y + (self._blocksize - self.cell_border_width) / 2)
+            else:
+                rx, ry = self.square_bottom_corner((x, y))
+                self._win.coords(item, x, y, rx, ry)
+
+    # sprites of robots that are still there are updated rather than
+    # drawn again, so that stepping through turns only touches the canvas
+    # items that change
     def update_sprites_new_turn(self):
-        for sprite in self._sprites:
-            sprite.clear()
-        self._sprites = []
-
         self.update_highlight_sprite()
         turn_action = self.current_turn_int()
         bots_activity = self._game.get_actions_on_turn(turn_action)
-        for bot_data in bots_activity.values():
-            self._sprites.append(RobotSprite(bot_data, self))
+
+        sprites = {}
+        for bot_data in bots_activity.itervalues():
+            key = bot_data['robot_id']
+            if key is None:
+                key = ('spawn', bot_data['loc'])
+            sprite = self._sprites.pop(key, None)
+            if sprite is None:
+                sprite = RobotSprite(bot_data, self)
+            else:
+                sprite.update(bot_data)
+            sprites[key] = sprite
+
+        for sprite in self._sprites.itervalues():
+            sprite.clear()
+        self._sprites = sprites
+        self._animated = [sprite for sprite in sprites.itervalues()
+                          if sprite.is_animated()]
 
     def update_highlight_sprite(self, repaint=False):
         if self._highlight_sprite is not None:
@@ -392,10 +528,13 @@ class Render(object):
     def paint_highlight_sprite(self, subframe_hlt=0):
         if self._highlight_sprite is not None:
             self._highlight_sprite.animate(subframe_hlt)
+            self._highlight_shown = not (
+                self._settings.highlight_cursor_blink and
+                subframe_hlt >= self._settings.highlight_cursor_blink_interval)
             self.update_layers()
 
     def paint(self, subframe=0, subframe_hlt=0):
-        for sprite in self._sprites:
+        for sprite in self._sprites.itervalues():
             sprite.animate(subframe)
         self.update_highlight_sprite()
         self.paint_highlight_sprite(subframe_hlt)
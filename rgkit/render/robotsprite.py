@@ -1,18 +1,23 @@
 import Tkinter
-from rgkit.render.utils import rgb_to_hex, blend_colors
-
-
-def compute_color(settings, player, hp):
-    r, g, b = settings.colors[player]
-    maxclr = min(hp, 50)
-    r += (100 - maxclr * 1.75) / 255
-    g += (100 - maxclr * 1.75) / 255
-    b += (100 - maxclr * 1.75) / 255
-    return (r, g, b)
+from rgkit.render.utils import rgb_to_hex, blend_colors, compute_color
 
 
 class RobotSprite(object):
     def __init__(self, action_info, render):
+        self.renderer = render
+        self.settings = self.renderer._settings
+        self.animation_offset = (0, 0)
+
+        # Tkinter objects
+        self.square = None
+        self.overlay = None
+        self.text = None
+
+        self.update(action_info)
+
+    # moves the sprite on to the robot's action_info of another turn,
+    # keeping its canvas items
+    def update(self, action_info):
         self.location = action_info['loc']
         self.location_next = action_info['loc_end']
         self.action = action_info['name']
@@ -20,14 +25,25 @@ class RobotSprite(object):
         self.hp = max(0, action_info['hp'])
         self.hp_next = max(0, action_info['hp_end'])
         self.id = action_info['player']
-        self.renderer = render
-        self.settings = self.renderer._settings
-        self.animation_offset = (0, 0)
 
-        # Tkinter objects
-        self.square = None
+        # the arrow is drawn once per turn
+        self.renderer.remove_object(self.overlay)
         self.overlay = None
-        self.text = None
+
+    # whether animate draws the sprite differently for different deltas
+    def is_animated(self):
+        if self.settings.bot_die_animation and (self.action == 'spawn' or
+                                                self.hp_next <= 0):
+            return True
+        if self.settings.bot_hp_animation and self.hp != self.hp_next:
+            return True
+        if not self.renderer._animations:
+            return False
+        if self.action == 'move' and self.target is not None:
+            return self.settings.bot_move_animation
+        if self.action == 'suicide':
+            return self.settings.bot_suicide_animation
+        return False
 
     def animate(self, delta=0):
         """Animate this sprite.
@@ -12,6 +12,15 @@ def rgb_to_hex(r, g, b, normalized=True):
         return '#%02x%02x%02x' % (r, g, b)
 
 
+def compute_color(settings, player, hp):
+    r, g, b = settings.colors[player]
+    maxclr = min(hp, 50)
+    r += (100 - maxclr * 1.75) / 255
+    g += (100 - maxclr * 1.75) / 255
+    b += (100 - maxclr * 1.75) / 255
+    return (r, g, b)
+
+
 def blend_colors(color1, color2, weight):
     r1, g1, b1 = color1
     r2, g2, b2 = color2
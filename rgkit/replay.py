@@ -0,0 +1,247 @@
+'''
+Compact binary replays of Game.history with random access by turn.
+
+Layout (little endian):
+
+    header   'RGRP', version (H), turn count (I), index offset (I),
+             robot record fields (6s)
+    turns    one block of fixed-width robot records per turn
+    index    turn count + 1 block offsets (I), the last one being the end
+
+A robot record is robot_id (I), x (B), y (B), hp (H), player_id (B) and one
+action byte: the action code in the high nibble and, for moves and
+attacks, the target as a direction relative to the robot in the low
+nibble. The header records the struct format of those fields, so readers
+follow the widths the replay was written with (version 1 replays, which
+had no such field, used HBBBBB). Every turn block is self-contained, so a
+reader only needs the index to decode any turn.
+
+ReplayWriter and JsonLinesWriter can also be handed to Game as a
+history_sink, which then gets every turn and its action records (see
+Game.get_actions_on_turn) as soon as it has been played. Given an actions_f,
+the writers store the action records there as one JSON list per turn and
+line, with locations as lists.
+'''
+import json
+import mmap
+import struct
+
+MAGIC = 'RGRP'
+VERSION = 2
+
+# robot_id, x, y, hp, player_id, action
+ROBOT_FIELDS = 'IBBHBB'
+VERSION_1_ROBOT_FIELDS = 'HBBBBB'
+
+_header = struct.Struct('<4sHII')
+_fields = struct.Struct('<6s')
+_offset = struct.Struct('<I')
+_robot = struct.Struct('<' + ROBOT_FIELDS)
+
+# action code 0 means the robot did not act (it has just spawned)
+ACTIONS = (None, 'guard', 'move', 'attack', 'suicide')
+
+# same order as rg.locs_around
+OFFSETS = ((0, 1), (1, 0), (0, -1), (-1, 0))
+
+
+def _encode_action(robot):
+    if 'action' not in robot:
+        return 0
+
+    action = robot['action']
+    code = ACTIONS.index(action[0]) << 4
+    if action[0] in ('move', 'attack'):
+        x, y = robot['location']
+        code |= OFFSETS.index((action[1][0] - x, action[1][1] - y))
+    return code
+
+
+def _decode_robot(record, data, offset):
+    robot_id, x, y, hp, player_id, code = record.unpack_from(data, offset)
+    robot = {
+        'location': (x, y),
+        'hp': hp,
+        'player_id': player_id,
+        'robot_id': robot_id,
+    }
+
+    name = ACTIONS[code >> 4]
+    if name in ('move', 'attack'):
+        dx, dy = OFFSETS[code & 0xf]
+        robot['action'] = [name, (x + dx, y + dy)]
+    elif name is not None:
+        robot['action'] = [name]
+    return robot
+
+
+class _LineWriter(object):
+    '''
+    Writes values as one JSON document per line, buffering up to
+    buffer_size bytes between writes.
+    '''
+
+    def __init__(self, f, buffer_size):
+        self._f = f
+        self._buffer = []
+        self._buffered = 0
+        self._buffer_size = buffer_size
+
+    def write(self, value):
+        line = json.dumps(value, separators=(',', ':')) + '\n'
+        self._buffer.append(line)
+        self._buffered += len(line)
+        if self._buffered >= self._buffer_size:
+            self.flush()
+
+    def flush(self):
+        self._f.write(''.join(self._buffer))
+        self._f.flush()
+        self._buffer = []
+        self._buffered = 0
+
+
+# writes actions_on_turn = Game.get_actions_on_turn(turn) to actions, a
+# _LineWriter or None
+def _write_actions(actions, actions_on_turn):
+    if actions is not None:
+        actions.write([actions_on_turn[loc]
+                       for loc in sorted(actions_on_turn)])
+
+
+class ReplayWriter(object):
+    '''
+    Writes turns one at a time to a seekable binary file, buffering up to
+    buffer_size bytes between writes.
+    '''
+
+    def __init__(self, f, buffer_size=1 << 16, actions_f=None):
+        self._f = f
+        self._actions = None
+        if actions_f is not None:
+            self._actions = _LineWriter(actions_f, buffer_size)
+        self._start = f.tell()
+        self._pos = _header.size + _fields.size
+        self._offsets = []
+        self._buffer = []
+        self._buffered = 0
+        self._buffer_size = buffer_size
+        f.write(_header.pack(MAGIC, VERSION, 0, 0))
+        f.write(_fields.pack(ROBOT_FIELDS))
+
+    # robots = one entry of Game.history
+    def write_turn(self, robots):
+        block = ''.join(
+            _robot.pack(robot['robot_id'],
+                        robot['location'][0], robot['location'][1],
+                        robot['hp'], robot['player_id'],
+                        _encode_action(robot))
+            for robot in robots)
+        self._offsets.append(self._pos)
+        self._pos += len(block)
+
+        self._buffer.append(block)
+        self._buffered += len(block)
+        if self._buffered >= self._buffer_size:
+            self.flush()
+
+    # actions_on_turn = Game.get_actions_on_turn(turn) of the last turn
+    def write_actions(self, actions_on_turn):
+        _write_actions(self._actions, actions_on_turn)
+
+    def flush(self):
+        self._f.write(''.join(self._buffer))
+        self._buffer = []
+        self._buffered = 0
+        if self._actions is not None:
+            self._actions.flush()
+
+    def close(self):
+        self.flush()
+        offsets = self._offsets + [self._pos]
+        self._f.write(''.join(_offset.pack(o) for o in offsets))
+
+        end = self._f.tell()
+        self._f.seek(self._start)
+        self._f.write(_header.pack(MAGIC, VERSION, len(self._offsets),
+                                   self._pos))
+        self._f.seek(end)
+
+
+class JsonLinesWriter(object):
+    '''
+    Writes turns as one JSON list of robots per line, buffering up to
+    buffer_size bytes between writes. Locations become lists.
+    '''
+
+    def __init__(self, f, buffer_size=1 << 16, actions_f=None):
+        self._turns = _LineWriter(f, buffer_size)
+        self._actions = None
+        if actions_f is not None:
+            self._actions = _LineWriter(actions_f, buffer_size)
+
+    # robots = one entry of Game.history
+    def write_turn(self, robots):
+        self._turns.write(robots)
+
+    # actions_on_turn = Game.get_actions_on_turn(turn) of the last turn
+    def write_actions(self, actions_on_turn):
+        _write_actions(self._actions, actions_on_turn)
+
+    def flush(self):
+        self._turns.flush()
+        if self._actions is not None:
+            self._actions.flush()
+
+    def close(self):
+        self.flush()
+
+
+def write_replay(fname, history):
+    with open(fname, 'wb') as f:
+        writer = ReplayWriter(f)
+        for robots in history:
+            writer.write_turn(robots)
+        writer.close()
+
+
+class ReplayReader(object):
+    '''
+    Memory-maps a replay; replay[turn] decodes just that turn into the
+    Game.history format.
+    '''
+
+    def __init__(self, fname):
+        with open(fname, 'rb') as f:
+            self._data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        magic, version, self._turns, self._index = \
+            _header.unpack_from(self._data, 0)
+        if magic != MAGIC or not 1 <= version <= VERSION:
+            raise ValueError('{0} is not a version 1-{1} replay'.format(
+                fname, VERSION))
+        fields = VERSION_1_ROBOT_FIELDS
+        if version > 1:
+            fields, = _fields.unpack_from(self._data, _header.size)
+        self._robot = struct.Struct('<' + fields)
+
+    def __len__(self):
+        return self._turns
+
+    def __getitem__(self, turn):
+        if turn < 0:
+            turn += self._turns
+        if not 0 <= turn < self._turns:
+            raise IndexError(turn)
+
+        start, end = struct.unpack_from(
+            '<II', self._data, self._index + turn * _offset.size)
+        return [_decode_robot(self._robot, self._data, offset)
+                for offset in xrange(start, end, self._robot.size)]
+
+    def __iter__(self):
+        for turn in xrange(self._turns):
+            yield self[turn]
+
+    def close(self):
+        self._data.close()
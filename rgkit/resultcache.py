@@ -0,0 +1,104 @@
+import errno
+import hashlib
+import json
+import os
+import tempfile
+
+from rgkit import counterrandom, game, gamestate, rg
+
+
+def engine_version():
+    '''
+    Hash of the engine sources, so that results recorded by an older engine
+    are never served for a newer one.
+    '''
+    sha = hashlib.sha1()
+    for module in (rg, counterrandom, gamestate, game):
+        with open(os.path.splitext(module.__file__)[0] + '.py') as f:
+            sha.update(f.read())
+    return sha.hexdigest()
+
+
+# settings that change how a match plays out
+GAME_SETTINGS = ('spawn_every', 'spawn_per_player', 'board_size', 'robot_hp',
+                 'attack_range', 'collision_damage', 'suicide_damage',
+                 'max_turns', 'str_limit', 'max_usercode_time',
+                 'exposed_properties', 'player_only_properties',
+                 'user_obj_types', 'valid_commands', 'user_modules')
+
+# settings holding collections of locations, sets for the bundled maps
+LOCATION_SETTINGS = ('spawn_coords', 'obstacles', 'start1', 'start2')
+
+
+def settings_checksum(settings):
+    '''
+    Hash of the GAME_SETTINGS values, including the usercode time limit, and
+    of the LOCATION_SETTINGS as sorted lists.
+    '''
+    values = [[name, settings.get(name)] for name in GAME_SETTINGS]
+    for name in LOCATION_SETTINGS:
+        locs = settings.get(name)
+        if locs is not None:
+            locs = sorted(list(loc) for loc in locs)
+        values.append([name, locs])
+    return hashlib.sha1(json.dumps(values)).hexdigest()
+
+
+class ResultCache(object):
+    '''
+    On-disk store of match results for one map.
+
+    Results are keyed by (sha1 of player 1 source, sha1 of player 2 source,
+    map checksum, match seed, engine version, settings checksum) and kept as
+    one JSON file per match under path, so concurrent writers never clobber
+    each other.
+    Histories come back with locations as lists rather than tuples.
+    '''
+
+    # settings = the settings the matches are played with, game.settings by
+    # default
+    def __init__(self, path, map_checksum, version=None, settings=None):
+        self._path = path
+        self._map_checksum = map_checksum
+        if version is None:
+            version = engine_version()
+        self._version = version
+        if settings is None:
+            settings = game.settings
+        self._settings = settings_checksum(settings)
+
+    def _file(self, code1, code2, match_seed):
+        key = json.dumps([hashlib.sha1(code1).hexdigest(),
+                          hashlib.sha1(code2).hexdigest(),
+                          self._map_checksum,
+                          str(match_seed),
+                          self._version,
+                          self._settings])
+        digest = hashlib.sha1(key).hexdigest()
+        return os.path.join(self._path, digest[:2], digest + '.json')
+
+    # returns {'scores': scores, 'history': history or None} or None
+    def get(self, code1, code2, match_seed):
+        try:
+            with open(self._file(code1, code2, match_seed)) as f:
+                return json.load(f)
+        except (IOError, ValueError):
+            return None
+
+    def put(self, code1, code2, match_seed, scores, history=None):
+        fname = self._file(code1, code2, match_seed)
+        dirname = os.path.dirname(fname)
+        try:
+            os.makedirs(dirname)
+        except OSError, e:
+            if e.errno != errno.EEXIST:
+                raise
+
+        fd, tmp = tempfile.mkstemp(dir=dirname)
+        with os.fdopen(fd, 'w') as f:
+            json.dump({'scores': scores, 'history': history}, f)
+        try:
+            os.rename(tmp, fname)
+        except OSError:
+            # someone else stored the same match first
+            os.remove(tmp)
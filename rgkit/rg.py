@@ -1,3 +1,11 @@
+import array
+import collections
+import errno
+import hashlib
+import os
+import sys
+import tempfile
+import weakref
 from math import sqrt
 
 settings = None
@@ -5,8 +13,12 @@ CENTER_POINT = None
 
 
 def after_settings():
-    global CENTER_POINT
+    global CENTER_POINT, _around
     CENTER_POINT = (int(settings.board_size / 2), int(settings.board_size / 2))
+    _cell_types.clear()
+    _around = settings.topology.around
+    for memo in _memo_dicts.values():
+        memo.switch(settings.topology.checksum)
 
 
 def set_settings(s):
@@ -25,40 +37,406 @@ def wdist(p1, p2):
     return abs(p2[0] - p1[0]) + abs(p2[1] - p1[1])
 
 
-def memoize(f):
-    """ Memoization decorator for a function taking a single argument """
-    class MemoDict(dict):
-        def __missing__(self, key):
-            ret = self[key] = f(key)
-            return ret
-    return MemoDict().__getitem__
+MEMOIZE_MAPS = 4
+TOPOLOGY_CACHE_SIZE = 16
 
 
-@memoize
-def loc_types(loc):
-    for i in range(2):
-        if not 0 <= loc[i] < settings.board_size:
-            return set(['invalid'])
+class BoundedCache(object):
+    '''
+    Holds at most size entries, evicting the least recently used one for
+    every new one once it is full. Counts hits and misses.
+    '''
 
-    types = set(['normal'])
-    if loc in settings.spawn_coords:
-        types.add('spawn')
-    if loc in settings.obstacles:
-        types.add('obstacle')
-    return types
+    def __init__(self, size):
+        self.size = size
+        self.hits = 0
+        self.misses = 0
+        self._entries = collections.OrderedDict()
+
+    def __len__(self):
+        return len(self._entries)
+
+    # returns the entry for key, storing compute() for it if there is none
+    def get(self, key, compute):
+        try:
+            value = self._entries.pop(key)
+        except KeyError:
+            self.misses += 1
+            value = compute()
+            if len(self._entries) >= self.size:
+                self._entries.popitem(last=False)
+        else:
+            self.hits += 1
+        self._entries[key] = value
+        return value
+
+    def clear(self):
+        self._entries.clear()
+        self.hits = 0
+        self.misses = 0
+
+    def stats(self):
+        return {'hits': self.hits, 'misses': self.misses,
+                'entries': len(self._entries), 'size': self.size}
+
+
+class MemoDict(dict):
+    '''
+    Results of one memoized function for the active map.
+
+    The entries of up to maps - 1 other maps are kept aside and evicted a
+    whole map at a time, least recently used first. Only misses are
+    counted, so that a hit stays a single dict lookup.
+    '''
+
+    def __init__(self, f, maps):
+        self._f = f
+        self.maps = maps
+        self.misses = 0
+        self._checksum = None
+        self._others = collections.OrderedDict()
+
+    def __missing__(self, arg):
+        self.misses += 1
+        value = self[arg] = self._f(arg)
+        return value
+
+    # makes the entries for the map with this checksum the active ones
+    def switch(self, checksum):
+        if checksum == self._checksum:
+            return
+        entries = self._others.pop(checksum, ())
+        if self._checksum is not None:
+            self._others[self._checksum] = dict(self)
+            while len(self._others) >= self.maps:
+                self._others.popitem(last=False)
+        self.clear()
+        self.update(entries)
+        self._checksum = checksum
+
+    def stats(self):
+        return {'misses': self.misses, 'entries': len(self),
+                'maps': len(self._others) + 1, 'size': self.maps}
+
+
+# id -> MemoDict of every memoized function, switched by after_settings
+_memo_dicts = weakref.WeakValueDictionary()
+
+
+def memoize(f, maps=MEMOIZE_MAPS):
+    """ Memoization decorator for a function taking a single argument
+
+    Results are cached per map, in a MemoDict available as the __self__
+    attribute of the result. """
+    memo = MemoDict(f, maps)
+    if settings is not None:
+        memo.switch(settings.topology.checksum)
+    _memo_dicts[id(memo)] = memo
+    return memo.__getitem__
+
+
+# cell types, as bits of Topology.types
+NORMAL, SPAWN, OBSTACLE, INVALID = 1, 2, 4, 8
+TYPE_BITS = {
+    'normal': NORMAL,
+    'spawn': SPAWN,
+    'obstacle': OBSTACLE,
+    'invalid': INVALID,
+}
+
+# cell type bits -> the set loc_types returns for them
+_type_names = dict(
+    (bits, frozenset(name for name, bit in TYPE_BITS.iteritems()
+                     if bits & bit))
+    for bits in xrange(INVALID * 2))
+
+
+# loc -> loc_types(loc) for the active map, filled on first use like the
+# memoized loc_types it replaces
+class _CellTypes(dict):
+    def __missing__(self, loc):
+        types = self[loc] = settings.topology.names.get(
+            loc, _type_names[INVALID])
+        return types
+
+
+# tuple(filter_out) -> type bits
+_filter_masks = {}
 
 
-@memoize
 def _locs_around(loc):
     x, y = loc
     offsets = ((0, 1), (1, 0), (0, -1), (-1, 0))
     return [(x + dx, y + dy) for dx, dy in offsets]
 
 
+def map_checksum(settings):
+    return hashlib.md5(repr((settings.board_size,
+                             sorted(settings.spawn_coords),
+                             sorted(settings.obstacles)))).hexdigest()
+
+
+class Topology(object):
+    '''
+    Cell types and neighbours of one map, computed once per map by
+    get_topology.
+
+    types maps every cell of the board to its type bits; around[loc, mask]
+    is the tuple of neighbours of loc that have none of the bits in mask,
+    for every cell and every combination of types.
+    '''
+
+    def __init__(self, settings):
+        spawn = set(settings.spawn_coords)
+        obstacles = set(settings.obstacles)
+        self.checksum = map_checksum(settings)
+        self.size = settings.board_size
+        self._paths = None
+
+        self.types = {}
+        for x in xrange(settings.board_size):
+            for y in xrange(settings.board_size):
+                bits = NORMAL
+                if (x, y) in spawn:
+                    bits |= SPAWN
+                if (x, y) in obstacles:
+                    bits |= OBSTACLE
+                self.types[x, y] = bits
+
+        self.names = dict((loc, _type_names[bits])
+                          for loc, bits in self.types.iteritems())
+
+        self.around = {}
+        for loc in self.types:
+            for mask in xrange(INVALID * 2):
+                self.around[loc, mask] = self._filter_around(loc, mask)
+
+    def _filter_around(self, loc, mask):
+        return tuple(a_loc for a_loc in _locs_around(loc)
+                     if not self.cell_type(a_loc) & mask)
+
+    def cell_type(self, loc):
+        return self.types.get(loc, INVALID)
+
+    def locs_around(self, loc, mask=0):
+        try:
+            return self.around[loc, mask]
+        except KeyError:
+            # loc is off the board
+            return self._filter_around(loc, mask)
+
+    # returns the PathTable of this map, loading it from cache_dir or
+    # computing (and storing) it on first use
+    def paths(self, cache_dir=None):
+        if self._paths is None:
+            self._paths = PathTable.read(self, cache_dir)
+        if self._paths is None:
+            # kept even if storing it fails or is interrupted
+            self._paths = PathTable.compute(self)
+            self._paths.save(self, cache_dir)
+        return self._paths
+
+
+class PathTable(object):
+    '''
+    Shortest walking distances and next steps between all pairs of cells
+    that are on the board and not obstacles.
+
+    For cells i and j (x + y * board size), dist[i * cells + j] is the
+    number of moves from i to j, and step[i * cells + j] the cell to move to
+    first, the first one in locs_around order if there are several; both
+    are -1 if there is no path. They are NumPy arrays if NumPy is installed
+    and array.array('h') otherwise.
+    '''
+
+    def __init__(self, topology, dist, step):
+        self._size = topology.size
+        self._cells = topology.size ** 2
+        self._index = dict((loc, loc[0] + loc[1] * topology.size)
+                           for loc in topology.types)
+        self.dist = dist
+        self.step = step
+
+    def path_dist(self, loc1, loc2):
+        i = self._index.get(loc1)
+        j = self._index.get(loc2)
+        if i is None or j is None:
+            return None
+
+        dist = int(self.dist[i * self._cells + j])
+        if dist < 0:
+            return None
+        return dist
+
+    def next_step(self, loc1, loc2):
+        i = self._index.get(loc1)
+        j = self._index.get(loc2)
+        if i is None or j is None:
+            return None
+        if i == j:
+            return loc1
+
+        step = int(self.step[i * self._cells + j])
+        if step < 0:
+            return None
+        return (step % self._size, step // self._size)
+
+    @staticmethod
+    def _file(topology, cache_dir):
+        return os.path.join(os.path.expanduser(cache_dir),
+                            topology.checksum + '.paths')
+
+    # returns the table stored in cache_dir, or None
+    @classmethod
+    def read(cls, topology, cache_dir):
+        if cache_dir is None:
+            return None
+        try:
+            with open(cls._file(topology, cache_dir), 'rb') as f:
+                values = array.array('h')
+                values.fromstring(f.read())
+        except IOError:
+            return None
+        if len(values) != 2 * topology.size ** 4:
+            return None
+        return cls._from_values(topology, values)
+
+    @classmethod
+    def _from_values(cls, topology, values):
+        count = topology.size ** 4
+        try:
+            import numpy
+        except ImportError:
+            return cls(topology, values[:count], values[count:])
+
+        values = numpy.frombuffer(values.tostring(), numpy.int16)
+        return cls(topology, values[:count], values[count:])
+
+    # stores the table in cache_dir; the table is only a cache, so failing
+    # to store it is reported on stderr and otherwise ignored
+    def save(self, topology, cache_dir):
+        if cache_dir is None:
+            return
+        fname = self._file(topology, cache_dir)
+        dirname = os.path.dirname(fname)
+        tmp = None
+        try:
+            try:
+                os.makedirs(dirname)
+            except OSError, e:
+                if e.errno != errno.EEXIST:
+                    raise
+
+            values = array.array('h', self.dist)
+            values.extend(array.array('h', self.step))
+            fd, tmp = tempfile.mkstemp(dir=dirname)
+            with os.fdopen(fd, 'wb') as f:
+                f.write(values.tostring())
+            os.rename(tmp, fname)
+        except (OSError, IOError), e:
+            message = 'could not store path table in {0}: {1}'
+            print >>sys.stderr, message.format(dirname, e)
+            if tmp is not None and os.path.exists(tmp):
+                os.remove(tmp)
+
+    @classmethod
+    def compute(cls, topology):
+        dist, step = _paths_bfs(topology)
+        dist.extend(step)
+        return cls._from_values(topology, dist)
+
+
+# returns the neighbour of every cell, by cell index and in locs_around
+# order, -1 for obstacles and cells off the board
+def _cell_neighbours(topology):
+    size = topology.size
+    neighbours = []
+    for i in xrange(size ** 2):
+        loc = (i % size, i // size)
+        neighbours.append([
+            a_loc[0] + a_loc[1] * size
+            if topology.cell_type(a_loc) & (INVALID | OBSTACLE) == 0 else -1
+            for a_loc in _locs_around(loc)])
+    return neighbours
+
+
+def _paths_bfs(topology):
+    cells = topology.size ** 2
+    neighbours = _cell_neighbours(topology)
+    dist = array.array('h', [-1]) * (cells * cells)
+    step = array.array('h', [-1]) * (cells * cells)
+
+    for target in xrange(cells):
+        loc = (target % topology.size, target // topology.size)
+        if topology.cell_type(loc) & OBSTACLE:
+            continue
+
+        # walk outwards from the target; the path is the same both ways
+        dist[target * cells + target] = 0
+        frontier = [target]
+        while frontier:
+            next_frontier = []
+            for i in frontier:
+                d = dist[i * cells + target]
+                for j in neighbours[i]:
+                    if j >= 0 and dist[j * cells + target] < 0:
+                        dist[j * cells + target] = d + 1
+                        next_frontier.append(j)
+            frontier = next_frontier
+
+        for i in xrange(cells):
+            d = dist[i * cells + target]
+            if d > 0:
+                for j in neighbours[i]:
+                    if j >= 0 and dist[j * cells + target] == d - 1:
+                        step[i * cells + target] = j
+                        break
+
+    return dist, step
+
+
+# map checksum -> Topology, so that switching between maps is cheap
+topologies = BoundedCache(TOPOLOGY_CACHE_SIZE)
+
+
+def get_topology(settings):
+    return topologies.get(map_checksum(settings),
+                          lambda: Topology(settings))
+
+
+_cell_types = _CellTypes()
+loc_types = _cell_types.__getitem__
+
+# Topology.around of the active map
+_around = {}
+
+
+# returns a new list every time, bots may change it
 def locs_around(loc, filter_out=None):
-    filter_out = set(filter_out or [])
-    return [a_loc for a_loc in _locs_around(loc)
-            if len(filter_out & loc_types(a_loc)) == 0]
+    mask = 0
+    if filter_out:
+        key = tuple(filter_out)
+        try:
+            mask = _filter_masks[key]
+        except KeyError:
+            for name in key:
+                mask |= TYPE_BITS.get(name, 0)
+            _filter_masks[key] = mask
+    try:
+        return list(_around[loc, mask])
+    except KeyError:
+        # loc is off the board
+        return list(settings.topology.locs_around(loc, mask))
+
+
+def path_dist(loc1, loc2):
+    return settings.topology.paths(settings.path_cache_dir).path_dist(
+        loc1, loc2)
+
+
+def next_step(loc1, loc2):
+    return settings.topology.paths(settings.path_cache_dir).next_step(
+        loc1, loc2)
 
 
 def toward(curr, dest):
@@ -73,12 +451,12 @@ def toward(curr, dest):
     move_x = (x0 + cmp(x_diff, 0), y0)
 
     if abs(y_diff) > abs(x_diff):
-        if move_y not in settings.obstacles:
+        if not settings.topology.cell_type(move_y) & OBSTACLE:
             return move_y
         else:
             return move_x
     else:
-        if move_x not in settings.obstacles:
+        if not settings.topology.cell_type(move_x) & OBSTACLE:
             return move_x
         else:
             return move_y
@@ -3,9 +3,12 @@
 import argparse
 from argparse import RawTextHelpFormatter
 import ast
+import hashlib
 import imp
 import inspect
+import math
 import pkg_resources
+import Queue
 import random
 import sys
 import os
@@ -27,6 +30,8 @@ except ImportError:
     sys.path.insert(0, parentdir)
 
 from rgkit import game
+from rgkit.resultcache import ResultCache
+from rgkit.tracing import Tracer
 
 parser = argparse.ArgumentParser(description="Robot game execution script.",
                                  formatter_class=RawTextHelpFormatter)
@@ -60,6 +65,27 @@ parser.add_argument("--game-seed",
                     help="Appended with game countfor per-match seeds.")
 parser.add_argument("--match-seeds", nargs='*',
                     help="Used for random seed of the first matches in order.")
+parser.add_argument("--max-usercode-time", type=int, metavar="MS",
+                    help="Time each bot gets per turn for all its robots,\n\
+default: {0}".format(game.settings.max_usercode_time))
+parser.add_argument("--timing", action="store_true",
+                    default=False,
+                    help="Print act() latencies of each bot after a game.")
+parser.add_argument("--cache", metavar="DIR",
+                    help="Reuse match results stored in DIR, and store new\n\
+ones there. Only used with -H.")
+parser.add_argument("--until-significant", action="store_true",
+                    default=False,
+                    help="Stop once one bot is significantly better,\n\
+playing at most COUNT games.")
+parser.add_argument("--profile", action="store_true",
+                    default=False,
+                    help="Print the time spent in each phase of play,\n\
+summed over all games.")
+parser.add_argument("--trace", metavar="FILE",
+                    help="Write a timeline of the turns, their phases and\n\
+act calls of all games to FILE, in Chrome trace event\n\
+format.")
 
 
 def mute_all():
@@ -72,33 +98,81 @@ def unmute_all():
     sys.stderr = sys.__stderr__
 
 
-def make_player(fname):
+def read_bot(fname):
     try:
         with open(fname) as f:
-            return game.Player(code=f.read())
+            return f.read()
     except IOError, msg:
         if pkg_resources.resource_exists('rgkit', fname):
             with open(pkg_resources.resource_filename('rgkit', fname)) as f:
-                return game.Player(code=f.read())
+                return f.read()
         raise IOError(msg)
 
 
+def make_player(fname):
+    return game.Player(code=read_bot(fname))
+
+
+# {(sha1 of bot source, player slot): Player}, per worker process
+_worker_players = {}
+
+
+def worker_player(code, slot):
+    """
+    Player for this source that has only been compiled once in this process.
+
+    Both sides of a self-play match get their own module, and every call
+    hands out a fresh Robot instance.
+    """
+    key = (hashlib.sha1(code).hexdigest(), slot)
+    if key in _worker_players:
+        _worker_players[key].reset()
+    else:
+        _worker_players[key] = game.Player(code=code)
+    return _worker_players[key]
+
+
+def print_timing_stats(players, names):
+    for name, player in zip(names, players):
+        stats = player.get_timing_stats()
+        print ('{0}: act() mean {1:.2f} ms, p95 {2:.2f} ms, max {3:.2f} ms, '
+               '{4} timeouts').format(name, stats.mean, stats.p95, stats.max,
+                                      stats.timeouts)
+
+
+def print_profile(profile):
+    total = sum(profile.values()) or 1.0
+    phases = list(game.PROFILE_PHASES)
+    phases += sorted(set(profile) - set(phases))
+    for phase in phases:
+        seconds = profile.get(phase, 0.0)
+        print '{0:16} {1:10.3f} s {2:6.1%}'.format(
+            phase, seconds, seconds / total)
+
+
+# profile = game.Profile to add the time spent in each phase to,
+# tracer = tracing.Tracer to add the timeline of the game to
 def play(players, print_info=True, animate_render=False, play_in_thread=False,
-         match_seed=None, names=["Red", "Blue"], quiet=0):
+         match_seed=None, names=["Red", "Blue"], quiet=0, print_timing=False,
+         profile=None, tracer=None):
     if play_in_thread:
         g = game.ThreadedGame(*players,
                               print_info=print_info,
                               record_actions=print_info,
                               record_history=True,
                               seed=match_seed,
-                              quiet=quiet)
+                              quiet=quiet,
+                              profile=profile,
+                              tracer=tracer)
     else:
         g = game.Game(*players,
                       print_info=print_info,
                       record_actions=print_info,
                       record_history=True,
                       seed=match_seed,
-                      quiet=quiet)
+                      quiet=quiet,
+                      profile=profile,
+                      tracer=tracer)
 
     if print_info:
         # only import render if we need to render the game;
@@ -108,87 +182,307 @@ def play(players, print_info=True, animate_render=False, play_in_thread=False,
 
     g.run_all_turns()
 
+    if print_timing:
+        print_timing_stats(players, names)
+
     if print_info:
         #print "rendering %s animations" % ("with"
         #                                   if animate_render else "without")
-        render.Render(g, game.settings, animate_render, names=names)
+        render.Render(g, game.settings, animate_render, names=names,
+                      profile=profile)
 
     return g.get_scores()
 
 
-def test_runs_sequentially(args):
-    players = [make_player(args.player1), make_player(args.player2)]
-    names = [bot_name(args.player1), bot_name(args.player2)]
-    scores = []
+def match_seeds(args):
+    # A sequential, deterministic seed is used for each match that can be
+    # overridden by user provided ones.
+    seeds = []
     for i in xrange(args.count):
-        # A sequential, deterministic seed is used for each match that can be
-        # overridden by user provided ones.
         match_seed = str(args.game_seed) + '-' + str(i)
         if args.match_seeds and i < len(args.match_seeds):
             match_seed = args.match_seeds[i]
-        result = play(players,
-                      not args.headless,
-                      args.animate,
-                      args.play_in_thread,
-                      match_seed=match_seed,
-                      names=names,
-                      quiet=args.quiet)
+        seeds.append(match_seed)
+    return seeds
+
+
+def sprt(scores, margin=0.1, alpha=0.05):
+    """
+    Sequential probability ratio test over the decisive games in scores.
+
+    Tests H0: player 1 wins with probability 0.5 - margin against
+    H1: 0.5 + margin, with error rates alpha for both. Returns 1 or 2 for
+    the player that is better, or None while more games are needed.
+    """
+    p1won = sum(p1 > p2 for p1, p2 in scores)
+    p2won = sum(p2 > p1 for p1, p2 in scores)
+    llr = (p1won - p2won) * math.log((0.5 + margin) / (0.5 - margin))
+    bound = math.log((1 - alpha) / alpha)
+    if llr >= bound:
+        return 1
+    if llr <= -bound:
+        return 2
+    return None
+
+
+# rendered games are always played, never looked up or stored
+def make_cache(args):
+    if args.cache is None or not args.headless:
+        return None
+    return ResultCache(args.cache, game.maps.available[args.map].checksum)
+
+
+# {seed: scores} for the matches already in cache
+def cached_scores(cache, code1, code2, seeds):
+    scores = {}
+    if cache is not None:
+        for match_seed in seeds:
+            result = cache.get(code1, code2, match_seed)
+            if result is not None:
+                scores[match_seed] = result['scores']
+                print '{0} - seed: {1} (cached)'.format(result['scores'],
+                                                        match_seed)
+    return scores
+
+
+def test_runs_sequentially(args, profile=None, tracer=None):
+    code1, code2 = read_bot(args.player1), read_bot(args.player2)
+    players = [game.Player(code=code1), game.Player(code=code2)]
+    names = [bot_name(args.player1), bot_name(args.player2)]
+    cache = make_cache(args)
+    scores = []
+    for match_seed in match_seeds(args):
+        result = cached_scores(cache, code1, code2, [match_seed]).get(
+            match_seed)
+        if result is None:
+            for player in players:
+                player.reset()
+            result = play(players,
+                          not args.headless,
+                          args.animate,
+                          args.play_in_thread,
+                          match_seed=match_seed,
+                          names=names,
+                          quiet=args.quiet,
+                          print_timing=args.timing,
+                          profile=profile,
+                          tracer=tracer)
+            if args.quiet >= 3 and args.headless:
+                unmute_all()
+            print '{0} - seed: {1}'.format(result, match_seed)
+            if cache is not None:
+                cache.put(code1, code2, match_seed, result)
         scores.append(result)
-        if args.quiet >= 3 and args.headless:
-            unmute_all()
-        print '{0} - seed: {1}'.format(result, match_seed)
+        if args.until_significant and sprt(scores) is not None:
+            break
     return scores
 
 
 def task(data):
-    (player1,
-     player2,
+    (code1,
+     code2,
+     names,
      headless,
      animate,
      play_in_thread,
-     match_seed,
-     quiet) = data
-
-    result = play(
-        [
-            make_player(player1),
-            make_player(player2)
-        ],
-        not headless,
-        animate,
-        play_in_thread,
-        match_seed=match_seed,
-        names=[
-            bot_name(player1),
-            bot_name(player2)
-        ],
-        quiet=quiet,
-    )
-    if quiet >= 3 and headless:
-        unmute_all()
-    print '{0} - seed: {1}'.format(result, match_seed)
-    return result
-
-
-def test_runs_concurrently(args):
-    data = []
-    for i in xrange(args.count):
-        match_seed = str(args.game_seed) + '-' + str(i)
-        if args.match_seeds and i < len(args.match_seeds):
-            match_seed = args.match_seeds[i]
-        data.append([
-            args.player1,
-            args.player2,
-            args.headless,
-            args.animate,
-            args.play_in_thread,
-            match_seed,
-            args.quiet,
-        ])
-    num_cpu = multiprocessing.cpu_count() - 1
-    if num_cpu == 0:
-        num_cpu = 1
-    return multiprocessing.Pool(num_cpu).map(task, data)
+     seeds,
+     quiet,
+     print_timing,
+     profiled,
+     traced) = data
+
+    profile = game.Profile() if profiled else None
+    tracer = Tracer() if traced else None
+    results = []
+    for match_seed in seeds:
+        result = play(
+            [
+                worker_player(code1, 0),
+                worker_player(code2, 1)
+            ],
+            not headless,
+            animate,
+            play_in_thread,
+            match_seed=match_seed,
+            names=names,
+            quiet=quiet,
+            print_timing=print_timing,
+            profile=profile,
+            tracer=tracer,
+        )
+        if quiet >= 3 and headless:
+            unmute_all()
+        print '{0} - seed: {1}'.format(result, match_seed)
+        results.append(result)
+    return results, profile, tracer and tracer.events
+
+
+# task(data), returning (None, result), or (error, None) if it raised error
+def checked_task(data):
+    try:
+        return None, task(data)
+    except Exception, e:
+        return e, None
+
+
+class MatchPool(object):
+    """
+    Long-lived worker processes for playing many matches.
+
+    Workers compile each distinct bot once (see worker_player) and receive
+    match seeds in batches, so the per-match cost is just the game itself.
+    Given a ResultCache, matches found there are not played again and newly
+    played ones are added to it, unless the matches are rendered.
+    """
+
+    def __init__(self, processes=None):
+        if processes is None:
+            processes = max(multiprocessing.cpu_count() - 1, 1)
+        self._processes = processes
+        self._pool = multiprocessing.Pool(processes)
+
+    def _tasks(self, code1, code2, names, seeds, batch_size, headless,
+               animate, play_in_thread, quiet, print_timing, profiled,
+               traced):
+        if batch_size is None:
+            # a few batches per worker to even out the load
+            batch_size = max(len(seeds) // (self._processes * 4), 1)
+
+        for i in xrange(0, len(seeds), batch_size):
+            yield [code1, code2, names, headless, animate, play_in_thread,
+                   seeds[i:i + batch_size], quiet, print_timing, profiled,
+                   traced]
+
+    # yields the scores of every match, in the order of seeds; given a
+    # game.Profile or a tracing.Tracer, the phase times or timelines of the
+    # matches played are added to them
+    def imap(self, player1, player2, seeds, batch_size=None, headless=True,
+             animate=False, play_in_thread=False, quiet=0, cache=None,
+             print_timing=False, profile=None, tracer=None):
+        code1, code2 = read_bot(player1), read_bot(player2)
+        names = [bot_name(player1), bot_name(player2)]
+        if not headless:
+            cache = None
+        cached = cached_scores(cache, code1, code2, seeds)
+        missing = [seed for seed in seeds if seed not in cached]
+
+        tasks = self._tasks(code1, code2, names, missing, batch_size,
+                            headless, animate, play_in_thread, quiet,
+                            print_timing, profile is not None,
+                            tracer is not None)
+
+        def play_missing():
+            for results, task_profile, events in self._pool.imap(task, tasks):
+                if profile is not None:
+                    profile.merge(task_profile)
+                if tracer is not None:
+                    tracer.extend(events)
+                for result in results:
+                    yield result
+
+        played = play_missing()
+        for match_seed in seeds:
+            if match_seed not in cached:
+                cached[match_seed] = next(played)
+                if cache is not None:
+                    cache.put(code1, code2, match_seed, cached[match_seed])
+            yield cached[match_seed]
+
+    def map(self, *args, **kwargs):
+        return list(self.imap(*args, **kwargs))
+
+    # yields (seed, scores) for every match as soon as its batch is done;
+    # only a few batches are queued at a time, so no new matches are
+    # started once the caller stops iterating
+    def imap_unordered(self, player1, player2, seeds, batch_size=1,
+                       headless=True, animate=False, play_in_thread=False,
+                       quiet=0, cache=None, print_timing=False, profile=None,
+                       tracer=None):
+        code1, code2 = read_bot(player1), read_bot(player2)
+        names = [bot_name(player1), bot_name(player2)]
+        if not headless:
+            cache = None
+        cached = cached_scores(cache, code1, code2, seeds)
+        for match_seed, result in cached.iteritems():
+            yield match_seed, result
+
+        missing = [seed for seed in seeds if seed not in cached]
+        tasks = self._tasks(code1, code2, names, missing, batch_size,
+                            headless, animate, play_in_thread, quiet,
+                            print_timing, profile is not None,
+                            tracer is not None)
+        # (batch seeds, checked_task result) of every finished batch
+        done = Queue.Queue()
+
+        def submit():
+            data = next(tasks, None)
+            if data is None:
+                return 0
+            self._pool.apply_async(
+                checked_task, (data,),
+                callback=lambda result, seeds=data[6]: done.put(
+                    (seeds, result)))
+            return 1
+
+        pending = sum(submit() for _ in xrange(self._processes * 2))
+        while pending:
+            batch_seeds, (error, result) = done.get()
+            if error is not None:
+                raise error
+            pending += submit() - 1
+
+            results, task_profile, events = result
+            if profile is not None:
+                profile.merge(task_profile)
+            if tracer is not None:
+                tracer.extend(events)
+            for match_seed, scores in zip(batch_seeds, results):
+                if cache is not None:
+                    cache.put(code1, code2, match_seed, scores)
+                yield match_seed, scores
+
+    def close(self):
+        self._pool.close()
+        self._pool.join()
+
+    # stops the workers at once, dropping the matches still queued
+    def terminate(self):
+        self._pool.terminate()
+        self._pool.join()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def test_runs_concurrently(args, profile=None, tracer=None):
+    options = dict(headless=args.headless,
+                   animate=args.animate,
+                   play_in_thread=args.play_in_thread,
+                   quiet=args.quiet,
+                   cache=make_cache(args),
+                   print_timing=args.timing,
+                   profile=profile,
+                   tracer=tracer)
+
+    with MatchPool() as pool:
+        if not args.until_significant:
+            return pool.map(args.player1, args.player2, match_seeds(args),
+                            **options)
+
+        scores = []
+        results = pool.imap_unordered(args.player1, args.player2,
+                                      match_seeds(args), **options)
+        for _, result in results:
+            scores.append(result)
+            if sprt(scores) is not None:
+                # the matches still queued are not needed any more
+                results.close()
+                pool.terminate()
+                break
+        return scores
 
 
 def bot_name(path_to_bot):
@@ -201,17 +495,35 @@ def main():
         mute_all()
 
     game.init_settings(args.map)
+    if args.max_usercode_time is not None:
+        game.settings.max_usercode_time = args.max_usercode_time
     print('Game seed: {0}'.format(args.game_seed))
 
     runner = test_runs_sequentially
     if _is_multiprocessing_supported and args.count > 1:
         runner = test_runs_concurrently
-    scores = runner(args)
+    profile = game.Profile() if args.profile else None
+    tracer = Tracer() if args.trace else None
+    scores = runner(args, profile, tracer)
 
     if args.count > 1:
         p1won = sum(p1 > p2 for p1, p2 in scores)
         p2won = sum(p2 > p1 for p1, p2 in scores)
-        print [p1won, p2won, args.count - p1won - p2won]
+        print [p1won, p2won, len(scores) - p1won - p2won]
+        if args.until_significant:
+            better = sprt(scores)
+            if better is None:
+                print 'No significant difference after {0} games'.format(
+                    len(scores))
+            else:
+                print '{0} is better after {1} games'.format(
+                    bot_name([args.player1, args.player2][better - 1]),
+                    len(scores))
+
+    if profile is not None:
+        print_profile(profile)
+    if tracer is not None:
+        tracer.save(args.trace)
 
 
 if __name__ == '__main__':
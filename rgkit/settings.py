@@ -14,6 +14,7 @@ settings = {
     # commented out lines are the settings used for the old animated mode
     'FPS': 60,  # frames per second
     'turn_interval': 300,  # milliseconds per turn
+    'resize_delay': 150,  # milliseconds without resizing before redrawing
 
     # colors
     'colors': [(0.49, 0.14, 0.14), (0.14, 0.14, 0.49)],
@@ -51,12 +52,16 @@ settings = {
     'default_rating': 1200,
 
     # user-scripting
-    'max_usercode_time': 1500,
+    'max_usercode_time': 1500,  # ms per player and turn, None: no limit
     'exposed_properties': ('location', 'hp', 'player_id'),
     'player_only_properties': ('robot_id',),
     'user_obj_types': ('Robot',),
     'valid_commands': ('move', 'attack', 'guard', 'suicide'),
     'user_modules': ('numpy', 'euclid', 'random'),
+
+    # where to store the rg.path_dist and rg.next_step tables, e.g.
+    # '~/.rgkit/paths'; None: compute them in every process
+    'path_cache_dir': None,
 }
 
 # just change stuff above this line
@@ -0,0 +1,67 @@
+'''
+Timelines of games in the Chrome trace event format.
+
+A Tracer handed to Game gets begin and end events for every turn, the
+phases of each turn and every act call, with the turn, player and robot_id
+in their args. The saved JSON file opens in chrome://tracing or Perfetto.
+Timestamps are wall clock time, so the events of games played in other
+processes line up after extend.
+'''
+import json
+import os
+import time
+
+
+class _Span(object):
+    def __init__(self, tracer, name, args):
+        self._tracer = tracer
+        self._name = name
+        self._args = args
+
+    def __enter__(self):
+        self._tracer.begin(self._name, self._args)
+
+    def __exit__(self, *exc_info):
+        self._tracer.end(self._name)
+
+
+class Tracer(object):
+    def __init__(self):
+        self.events = []
+        self._pid = os.getpid()
+
+    # when = time.time() of the event, now by default
+    def begin(self, name, args=None, when=None):
+        self._add('B', name, args, when)
+
+    def end(self, name, when=None):
+        self._add('E', name, None, when)
+
+    # with tracer.span(name, args): ... emits begin and end around the block
+    def span(self, name, args=None):
+        return _Span(self, name, args)
+
+    def _add(self, phase, name, args, when):
+        if when is None:
+            when = time.time()
+        event = {
+            'name': name,
+            'ph': phase,
+            'ts': int(when * 1e6),
+            'pid': self._pid,
+            'tid': 0,
+        }
+        if args is not None:
+            event['args'] = args
+        self.events.append(event)
+
+    # adds the events of another Tracer, e.g. one from a worker process
+    def extend(self, events):
+        self.events.extend(events)
+
+    def write(self, f):
+        json.dump({'traceEvents': self.events, 'displayTimeUnit': 'ms'}, f)
+
+    def save(self, fname):
+        with open(fname, 'w') as f:
+            self.write(f)
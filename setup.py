@@ -13,7 +13,9 @@ setup(
     entry_points={
         'console_scripts': [
             'rgrun = rgkit.run:main',
-            'rgmap = rgkit.mapeditor:main'
+            'rgmap = rgkit.mapeditor:main',
+            'rgbench = rgkit.bench:main',
+            'rgframes = rgkit.render.frames:main'
         ]
     },
 )
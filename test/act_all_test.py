@@ -0,0 +1,77 @@
+import ast
+import pkg_resources
+import unittest
+from rgkit import game
+from rgkit.gamestate import GameState
+
+map_data = ast.literal_eval(
+    open(pkg_resources.resource_filename('rgkit', 'maps/default.py')).read())
+settings = game.init_settings(map_data)
+
+batched_code = '''
+class Robot:
+    calls = 0
+
+    def act_all(self, game):
+        Robot.calls += 1
+        return dict((loc, ['move', (loc[0] + 1, loc[1])])
+                    for loc, robot in game.robots.iteritems()
+                    if robot.player_id == self.player_id)
+'''
+
+partial_code = '''
+class Robot:
+    def act_all(self, game):
+        return {(9, 9): ['move', (20, 20)], (5, 5): ['suicide']}
+'''
+
+broken_code = '''
+class Robot:
+    def act_all(self, game):
+        return [['suicide']]
+'''
+
+
+class TestActAll(unittest.TestCase):
+    def make_state(self):
+        state = GameState(settings)
+        state.add_robot((9, 9), 0)
+        state.add_robot((5, 5), 0)
+        state.add_robot((7, 7), 0)
+        state.add_robot((12, 12), 1)
+        return state
+
+    def test_called_once_per_turn(self):
+        player = game.Player(batched_code)
+        player.set_player_id(0)
+        actions = player.get_actions(self.make_state(), 0)
+
+        self.assertEqual(actions, {(9, 9): ['move', (10, 9)],
+                                   (5, 5): ['move', (6, 5)],
+                                   (7, 7): ['move', (8, 7)]})
+        self.assertEqual(player._module.Robot.calls, 1)
+        self.assertEqual([(turn, robot_id)
+                          for turn, robot_id, _ in player.timings],
+                         [(0, None)])
+
+    def test_invalid_and_missing_actions_guard(self):
+        player = game.Player(partial_code)
+        player.set_player_id(0)
+        actions = player.get_actions(self.make_state(), 0)
+        self.assertEqual(actions, {(9, 9): ['guard'],
+                                   (5, 5): ['suicide'],
+                                   (7, 7): ['guard']})
+
+    def test_not_a_dict(self):
+        player = game.Player(broken_code)
+        player.set_player_id(1)
+        actions = player.get_actions(self.make_state(), 0)
+        self.assertEqual(actions, {(12, 12): ['guard']})
+
+    def test_full_game(self):
+        g = game.Game(game.Player(batched_code), game.Player(batched_code),
+                      seed=1)
+        g.run_all_turns()
+        self.assertEqual(len(g.get_scores()), 2)
+        self.assertEqual(g.get_state(settings.max_turns).turn,
+                         settings.max_turns)
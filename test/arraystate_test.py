@@ -0,0 +1,91 @@
+import ast
+import pkg_resources
+import unittest
+from rgkit import game
+from rgkit.arraystate import ArrayGameState
+from rgkit.gamestate import GameState
+
+map_data = ast.literal_eval(
+    open(pkg_resources.resource_filename('rgkit', 'maps/default.py')).read())
+settings = game.init_settings(map_data)
+
+
+class TestArrayState(unittest.TestCase):
+    def test_add_robot(self):
+        state = ArrayGameState(settings)
+        state.add_robot((9, 9), 0, robot_id=7, hp=42)
+        self.assertTrue((9, 9) in state.robots)
+        self.assertEquals(state.robots[(9, 9)].location, (9, 9))
+        self.assertEquals(state.robots[(9, 9)].player_id, 0)
+        self.assertEquals(state.robots[(9, 9)].robot_id, 7)
+        self.assertEquals(state.robots[(9, 9)].hp, 42)
+        self.assertEquals(len(state.robots), 1)
+
+    def test_remove_robot(self):
+        state = ArrayGameState(settings)
+        state.add_robot((9, 9), 0)
+        state.remove_robot((9, 9))
+        self.assertFalse(state.is_robot((9, 9)))
+        self.assertFalse(state.is_robot((-1, 9)))
+        self.assertEquals(len(state.robots), 0)
+        self.assertRaises(KeyError, lambda: state.robots[9, 9])
+
+    def test_robots_view(self):
+        state = ArrayGameState(settings)
+        state.add_robot((9, 9), 0)
+        state.add_robot((6, 11), 1)
+        self.assertEqual(set(state.robots), set([(9, 9), (6, 11)]))
+        self.assertEqual(
+            sorted((loc, robot.player_id)
+                   for loc, robot in state.robots.iteritems()),
+            [((6, 11), 1), ((9, 9), 0)])
+        self.assertEqual(state.get_scores(), [1, 1])
+
+    def test_get_game_info(self):
+        state = ArrayGameState(settings)
+        state.add_robot((9, 9), 0)
+        state.add_robot((6, 11), 1)
+        game_info = state.get_game_info(0)
+        self.assertEquals(game_info.robots[9, 9].robot_id,
+                          state.robots[(9, 9)].robot_id)
+        self.assertEquals(game_info.robots[6, 11].hp, settings.robot_hp)
+        self.assertRaises(AttributeError,
+                          lambda: game_info.robots[6, 11].robot_id)
+
+    def test_same_moves_as_dict_state(self):
+        actions = {
+            (9, 10): ['move', (9, 11)],
+            (9, 12): ['move', (9, 11)],
+            (9, 11): ['move', (10, 11)],
+            (11, 11): ['move', (10, 11)],
+            (7, 7): ['suicide'],
+            (7, 8): ['guard'],
+            (6, 7): ['move', (6, 6)],
+        }
+        owners = {(9, 10): 0, (9, 12): 1, (9, 11): 0, (11, 11): 1,
+                  (7, 7): 1, (7, 8): 0, (6, 7): 0}
+
+        results = []
+        for state_cls in (GameState, ArrayGameState):
+            state = state_cls(settings, seed=3)
+            for loc in sorted(owners):
+                state.add_robot(loc, owners[loc])
+            state2 = state.apply_actions(actions, spawn=False)
+            results.append(sorted(
+                (loc, robot.hp, robot.player_id, robot.robot_id)
+                for loc, robot in state2.robots.iteritems()))
+
+        self.assertEqual(results[0], results[1])
+
+    def test_game_matches_dict_state(self):
+        code = open(pkg_resources.resource_filename(
+            'rgkit', 'bots/guardbot.py')).read()
+
+        histories = []
+        for state_cls in (GameState, ArrayGameState):
+            g = game.Game(game.Player(code), game.Player(code),
+                          record_history=True, seed=42, state_cls=state_cls)
+            g.run_all_turns()
+            histories.append([sorted(turn) for turn in g.history])
+
+        self.assertEqual(histories[0], histories[1])
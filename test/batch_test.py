@@ -0,0 +1,101 @@
+import ast
+import pkg_resources
+import random
+import unittest
+from rgkit import game, rg
+from rgkit.gamestate import GameState
+from rgkit.settings import AttrDict
+
+try:
+    from rgkit import batch
+except ImportError:
+    batch = None
+
+map_data = ast.literal_eval(
+    open(pkg_resources.resource_filename('rgkit', 'maps/default.py')).read())
+settings = game.init_settings(map_data)
+
+
+def random_actions(robots, rand):
+    actions = {}
+    for loc in robots:
+        choice = rand.random()
+        targets = rg.locs_around(loc, filter_out=['invalid', 'obstacle'])
+        if choice < 0.6:
+            actions[loc] = ['move', rand.choice(targets)]
+        elif choice < 0.75:
+            actions[loc] = ['attack', rand.choice(targets)]
+        elif choice < 0.8:
+            actions[loc] = ['suicide']
+        else:
+            actions[loc] = ['guard']
+    return actions
+
+
+@unittest.skipIf(batch is None, 'numpy is not installed')
+class TestBatch(unittest.TestCase):
+    def test_matches_game_state(self):
+        # fixed attack damage so that both engines agree exactly
+        fixed = AttrDict(settings)
+        fixed.attack_range = (9, 9)
+        rand = random.Random(5)
+        free = [(x, y) for x in xrange(settings.board_size)
+                for y in xrange(settings.board_size)
+                if 'obstacle' not in rg.loc_types((x, y))]
+
+        count = 40
+        engine = batch.BatchGame(fixed, count, use_start=False)
+        states = []
+        actions_per_game = []
+        for g in xrange(count):
+            state = GameState(fixed)
+            for loc in free:
+                if rand.random() < 0.5:
+                    player_id = rand.randint(0, 1)
+                    hp = rand.randint(1, settings.robot_hp)
+                    state.add_robot(loc, player_id, hp)
+                    engine.add_robot(g, loc, player_id, hp)
+            states.append(state)
+            actions_per_game.append(random_actions(state.robots, rand))
+
+        engine.run_turn(*engine.encode_actions(actions_per_game),
+                        spawn=False)
+
+        for g, state in enumerate(states):
+            expected = state.apply_actions(actions_per_game[g], spawn=False)
+            self.assertEqual(
+                dict((loc, (r.hp, r.player_id, r.robot_id))
+                     for loc, r in engine.get_state(g).robots.iteritems()),
+                dict((loc, (r.hp, r.player_id, r.robot_id))
+                     for loc, r in expected.robots.iteritems()))
+
+    def test_invalid_actions_guard(self):
+        engine = batch.BatchGame(settings, 1, use_start=False)
+        engine.add_robot(0, (1, 8), 0)
+        engine.add_robot(0, (9, 9), 1)
+        actions, directions = engine.encode_actions(
+            [{(1, 8): ['move', (0, 8)], (9, 9): ['dance']}])
+        engine.run_turn(actions, directions, spawn=False)
+        self.assertEqual(engine.player_id[0, engine.index((1, 8))], 0)
+        self.assertEqual(engine.player_id[0, engine.index((9, 9))], 1)
+
+    def test_spawn(self):
+        engine = batch.BatchGame(settings, 3, seed=1)
+        bots = [batch.GuardBot(), batch.GuardBot()]
+        engine.run_turn(*engine.get_actions(bots))
+        per_player = settings.spawn_per_player
+        self.assertEqual(engine.get_scores().tolist(),
+                         [[per_player, per_player]] * 3)
+        spawned = engine.player_id >= 0
+        self.assertEqual(sorted(engine.robot_id[spawned].tolist()),
+                         sorted(range(per_player * 2) * 3))
+        for g in xrange(3):
+            for loc in engine.get_state(g).robots:
+                self.assertTrue('spawn' in rg.loc_types(loc))
+
+    def test_run_all_turns(self):
+        engine = batch.BatchGame(settings, 8, seed=2)
+        scores = engine.run_all_turns(batch.RandomBot(3), batch.GuardBot())
+        self.assertEqual(engine.turn, settings.max_turns)
+        self.assertEqual(scores.shape, (8, 2))
+        self.assertTrue((engine.hp[engine.player_id >= 0] > 0).all())
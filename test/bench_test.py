@@ -0,0 +1,46 @@
+import ast
+import pkg_resources
+import unittest
+from rgkit import bench, game
+
+map_data = ast.literal_eval(
+    open(pkg_resources.resource_filename('rgkit', 'maps/default.py')).read())
+settings = game.init_settings(map_data)
+
+
+class TestBench(unittest.TestCase):
+    def setUp(self):
+        self._path_cache_dir = settings.path_cache_dir
+        settings.path_cache_dir = None
+
+    def tearDown(self):
+        settings.path_cache_dir = self._path_cache_dir
+
+    def test_crowded_state(self):
+        state = bench.crowded_state(settings, 0.5)
+        actions = bench.random_actions(state)
+        self.assertTrue(len(state.robots) > 50)
+        for loc, action in actions.iteritems():
+            self.assertTrue(state.is_valid_action(loc, action))
+
+    def test_run_benchmarks(self):
+        results = bench.run_benchmarks(settings, repeat=1,
+                                       name_filter='rg.loc_types')
+        self.assertEqual(results.keys(), ['rg.loc_types'])
+        self.assertTrue(results['rg.loc_types'] > 0)
+
+    def test_game_info_no_slower_than_copies(self):
+        results = bench.run_benchmarks(settings, repeat=5,
+                                       name_filter='_scan.crowded50')
+        self.assertTrue(
+            results['gamestate.get_game_info_scan.crowded50'] <=
+            results['gamestate.copy_robots_scan.crowded50'] * 1.1)
+
+    def test_compare(self):
+        rows, regressed = bench.compare({'a': 1.05, 'b': 2.0, 'c': 1.0},
+                                        {'a': 1.0, 'b': 1.0}, 0.1)
+        self.assertEqual([(name, round(change, 2))
+                          for name, _, _, change in rows],
+                         [('a', 0.05), ('b', 1.0)])
+        self.assertTrue(regressed)
+        self.assertFalse(bench.compare({'a': 1.05}, {'a': 1.0}, 0.1)[1])
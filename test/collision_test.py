@@ -0,0 +1,122 @@
+import ast
+import pkg_resources
+import random
+import unittest
+from collections import defaultdict
+from rgkit import game, rg
+from rgkit.gamestate import resolve_moves
+
+map_data = ast.literal_eval(
+    open(pkg_resources.resource_filename('rgkit', 'maps/default.py')).read())
+settings = game.init_settings(map_data)
+
+
+# the recursive resolver GameState.get_delta used before resolve_moves,
+# kept as a reference implementation
+def recursive_resolve_moves(robots, actions):
+    def dest(loc):
+        if actions[loc][0] == 'move':
+            return actions[loc][1]
+        else:
+            return loc
+
+    hitpoints = defaultdict(lambda: set())
+
+    def stuck(loc):
+        old_hitpoints = hitpoints[loc]
+        hitpoints[loc] = set([loc])
+
+        for rival in old_hitpoints:
+            if rival != loc:
+                stuck(rival)
+
+    for loc in robots:
+        hitpoints[dest(loc)].add(loc)
+
+    for loc in robots:
+        if len(hitpoints[dest(loc)]) > 1 or (dest(loc) in robots and
+                                             dest(loc) != loc and
+                                             dest(dest(loc)) == loc):
+            stuck(loc)
+
+    loc_ends = {}
+    for loc in robots:
+        if actions[loc][0] == 'move' and loc in hitpoints[loc]:
+            loc_ends[loc] = loc
+        else:
+            loc_ends[loc] = dest(loc)
+
+    collisions = defaultdict(lambda: set())
+    for loc in robots:
+        for loc2 in hitpoints[dest(loc)]:
+            collisions[loc].add(loc2)
+            collisions[loc2].add(loc)
+
+    return loc_ends, collisions
+
+
+def random_actions(robots, rand):
+    actions = {}
+    for loc in robots:
+        choice = rand.random()
+        if choice < 0.7:
+            targets = rg.locs_around(loc, filter_out=['invalid', 'obstacle'])
+            actions[loc] = ['move', rand.choice(targets)]
+        elif choice < 0.8:
+            actions[loc] = ['attack', rand.choice(rg.locs_around(loc))]
+        else:
+            actions[loc] = ['guard']
+    return actions
+
+
+class TestCollision(unittest.TestCase):
+    def assertSameResolution(self, robots, actions):
+        loc_ends, collisions = resolve_moves(robots, actions)
+        ref_loc_ends, ref_collisions = recursive_resolve_moves(robots,
+                                                               actions)
+        self.assertEqual(loc_ends, ref_loc_ends)
+        for loc in robots:
+            self.assertEqual(collisions[loc], ref_collisions[loc])
+
+    def test_matches_recursive_resolver(self):
+        rand = random.Random(1)
+        free = [(x, y) for x in xrange(settings.board_size)
+                for y in xrange(settings.board_size)
+                if 'obstacle' not in rg.loc_types((x, y))]
+
+        for density in (0.1, 0.5, 0.9, 1.0):
+            for _ in xrange(50):
+                robots = set(loc for loc in free if rand.random() < density)
+                self.assertSameResolution(robots,
+                                          random_actions(robots, rand))
+
+    def test_swap_and_pile_up(self):
+        robots = set([(9, 9), (8, 9), (10, 10), (10, 11), (9, 10), (11, 10)])
+        actions = {
+            (9, 9): ['move', (8, 9)],
+            (8, 9): ['move', (9, 9)],
+            (9, 10): ['move', (10, 10)],
+            (10, 11): ['move', (10, 10)],
+            (11, 10): ['move', (10, 10)],
+            (10, 10): ['move', (10, 9)],
+        }
+        self.assertSameResolution(robots, actions)
+        loc_ends, _ = resolve_moves(robots, actions)
+        self.assertEqual(loc_ends[9, 9], (9, 9))
+        self.assertEqual(loc_ends[10, 10], (10, 9))
+        self.assertEqual(loc_ends[9, 10], (9, 10))
+
+    def test_long_blocked_chain(self):
+        # far longer than the recursion limit would allow
+        length = 5000
+        robots = set((x, 0) for x in xrange(length))
+        actions = dict(((x, 0), ['move', (x - 1, 0)])
+                       for x in xrange(1, length))
+        actions[0, 0] = ['guard']
+
+        loc_ends, collisions = resolve_moves(robots, actions)
+
+        for loc in robots:
+            self.assertEqual(loc_ends[loc], loc)
+        self.assertEqual(collisions[length - 1, 0],
+                         set([(length - 2, 0)]))
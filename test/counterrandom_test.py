@@ -0,0 +1,67 @@
+import ast
+import pkg_resources
+import unittest
+from rgkit import counterrandom, game
+from rgkit.arraystate import ArrayGameState
+from rgkit.gamestate import GameState
+
+map_data = ast.literal_eval(
+    open(pkg_resources.resource_filename('rgkit', 'maps/default.py')).read())
+settings = game.init_settings(map_data)
+
+
+def attack_all(state):
+    actions = {}
+    for loc in state.robots:
+        targets = settings.topology.locs_around(loc)
+        actions[loc] = ['attack', targets[0]]
+    return actions
+
+
+class TestCounterRandom(unittest.TestCase):
+    def test_stream(self):
+        stream = counterrandom.CounterRandom('7-0').stream(
+            3, counterrandom.ATTACK)
+        again = counterrandom.CounterRandom('7-0').stream(
+            3, counterrandom.ATTACK)
+        other = counterrandom.CounterRandom('7-0').stream(
+            4, counterrandom.ATTACK)
+
+        values = [stream.randint(i, 8, 10) for i in xrange(1000)]
+        self.assertEqual(values, [again.randint(i, 8, 10)
+                                  for i in xrange(1000)])
+        self.assertNotEqual(values, [other.randint(i, 8, 10)
+                                     for i in xrange(1000)])
+        self.assertEqual(set(values), set([8, 9, 10]))
+        self.assertTrue(all(0 <= stream.random(i) < 1
+                            for i in xrange(1000)))
+
+    def test_resume_mid_game(self):
+        code = open(pkg_resources.resource_filename(
+            'rgkit', 'bots/randombot.py')).read()
+        g = game.Game(game.Player(code), game.Player(code), seed=42)
+        g.run_all_turns()
+
+        # rebuild turn 50 from scratch, it has to play out the same
+        state = g.get_state(50)
+        resumed = GameState(settings, turn=50,
+                            next_robot_id=state._next_robot_id, seed=g.seed)
+        for loc, robot in state.robots.iteritems():
+            resumed.add_robot(loc, robot.player_id, robot.hp, robot.robot_id)
+
+        actions = attack_all(state)
+        self.assertEqual(
+            sorted(state.apply_actions(actions).robots.items()),
+            sorted(resumed.apply_actions(actions).robots.items()))
+
+    def test_backends_attack_alike(self):
+        results = []
+        for state_cls in (GameState, ArrayGameState):
+            state = state_cls(settings, seed=5, turn=1)
+            for x in xrange(5, 14):
+                state.add_robot((x, 9), x % 2)
+            state = state.apply_actions(attack_all(state))
+            results.append(sorted(
+                (loc, robot.hp, robot.robot_id)
+                for loc, robot in state.robots.iteritems()))
+        self.assertEqual(results[0], results[1])
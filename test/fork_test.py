@@ -0,0 +1,83 @@
+import ast
+import pkg_resources
+import random
+import unittest
+from rgkit import game, rg
+from rgkit.arraystate import ArrayGameState
+from rgkit.gamestate import GameState
+
+map_data = ast.literal_eval(
+    open(pkg_resources.resource_filename('rgkit', 'maps/default.py')).read())
+settings = game.init_settings(map_data)
+
+
+def random_actions(state, rand):
+    actions = {}
+    for loc in state.robots:
+        around = settings.topology.locs_around(loc, rg.INVALID | rg.OBSTACLE)
+        choice = rand.random()
+        if not around:
+            actions[loc] = ['guard']
+        elif choice < 0.5:
+            actions[loc] = ['move', rand.choice(around)]
+        elif choice < 0.8:
+            actions[loc] = ['attack', rand.choice(around)]
+        elif choice < 0.9:
+            actions[loc] = ['suicide']
+        else:
+            actions[loc] = ['guard']
+    return actions
+
+
+def snapshot(state):
+    return (state.turn, state._next_robot_id,
+            sorted((loc, robot.hp, robot.player_id, robot.robot_id)
+                   for loc, robot in state.robots.iteritems()))
+
+
+class TestFork(unittest.TestCase):
+    def make_state(self, state_cls):
+        state = state_cls(settings, seed=3)
+        for x in xrange(4, 15):
+            state.add_robot((x, 9), x % 2)
+            state.add_robot((x, 10), 1 - x % 2)
+        return state
+
+    def test_fork_is_independent(self):
+        for state_cls in (GameState, ArrayGameState):
+            state = self.make_state(state_cls)
+            before = snapshot(state)
+
+            fork = state.fork()
+            fork.apply(random_actions(fork, random.Random(1)))
+            fork.remove_robot((4, 9))
+
+            self.assertEqual(snapshot(state), before)
+            self.assertNotEqual(snapshot(fork), before)
+
+            state.remove_robot((5, 9))
+            self.assertTrue(fork.is_robot((5, 9)) or
+                            not any(loc == (5, 9) for loc in fork.robots))
+
+    def test_apply_matches_apply_actions(self):
+        rand = random.Random(2)
+        for state_cls in (GameState, ArrayGameState):
+            state = self.make_state(state_cls)
+            in_place = state.fork()
+            for _ in xrange(25):
+                actions = random_actions(state, rand)
+                state = state.apply_actions(actions)
+                in_place.apply(actions)
+                self.assertEqual(snapshot(in_place), snapshot(state))
+
+    def test_undo(self):
+        rand = random.Random(3)
+        for state_cls in (GameState, ArrayGameState):
+            state = self.make_state(state_cls)
+            snapshots = []
+            for _ in xrange(15):
+                snapshots.append(snapshot(state))
+                state.apply(random_actions(state, rand))
+            while snapshots:
+                state.undo()
+                self.assertEqual(snapshot(state), snapshots.pop())
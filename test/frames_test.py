@@ -0,0 +1,99 @@
+import ast
+import os
+import pkg_resources
+import shutil
+import struct
+import tempfile
+import unittest
+import zlib
+from rgkit import game
+from rgkit.render import frames
+
+map_data = ast.literal_eval(
+    open(pkg_resources.resource_filename('rgkit', 'maps/default.py')).read())
+settings = game.init_settings(map_data)
+
+history = [
+    [],
+    [{'location': (9, 9), 'hp': 50, 'player_id': 0, 'robot_id': 0,
+      'action': ['move', (9, 10)]},
+     {'location': (5, 5), 'hp': 8, 'player_id': 1, 'robot_id': 1,
+      'action': ['guard']}],
+]
+
+
+class TestFrames(unittest.TestCase):
+    def setUp(self):
+        self.renderer = frames.FrameRenderer(settings, block_size=12)
+
+    def pixel(self, pixels, x, y):
+        return self.renderer.palette[pixels[y * self.renderer.width + x]]
+
+    def test_render(self):
+        size = settings.board_size * 12
+        self.assertEqual((self.renderer.width, self.renderer.height),
+                         (size, size))
+
+        empty = self.renderer.render(history[0])
+        self.assertEqual(len(empty), size * size)
+        self.assertEqual(self.pixel(empty, 9 * 12, 9 * 12),
+                         frames.to_rgb(settings.normal_color))
+        self.assertEqual(self.pixel(empty, 9 * 12 + 11, 9 * 12),
+                         frames.GAP_COLOR)
+
+        pixels = self.renderer.render(history[1])
+        self.assertEqual(self.pixel(pixels, 5 * 12, 5 * 12),
+                         frames.to_rgb(frames.compute_color(settings, 1, 8)))
+        # the move arrow reaches into the cell below
+        self.assertEqual(self.pixel(pixels, 9 * 12 + 5, 10 * 12 + 2),
+                         frames.MOVE_COLOR)
+
+    def test_png(self):
+        png = self.renderer.png(history[1])
+        self.assertEqual(png[:8], '\x89PNG\r\n\x1a\n')
+
+        chunks = {}
+        offset = 8
+        while offset < len(png):
+            length, = struct.unpack_from('>I', png, offset)
+            kind = png[offset + 4:offset + 8]
+            chunks[kind] = png[offset + 8:offset + 8 + length]
+            offset += length + 12
+        self.assertEqual(struct.unpack('>II', chunks['IHDR'][:8]),
+                         (self.renderer.width, self.renderer.height))
+        self.assertEqual(len(chunks['PLTE']), 3 * len(self.renderer.palette))
+
+        rows = zlib.decompress(chunks['IDAT'])
+        width = self.renderer.width
+        self.assertEqual(
+            ''.join(rows[y * (width + 1) + 1:(y + 1) * (width + 1)]
+                    for y in xrange(self.renderer.height)),
+            str(self.renderer.render(history[1])))
+
+    def test_save(self):
+        directory = tempfile.mkdtemp()
+        try:
+            frames.save_pngs(history, self.renderer, directory,
+                             turns=[10, 11])
+            self.assertEqual(sorted(os.listdir(directory)),
+                             ['turn010.png', 'turn011.png'])
+
+            fname = os.path.join(directory, 'game.gif')
+            frames.save_gif(history, self.renderer, fname, delay=30)
+            with open(fname, 'rb') as f:
+                gif = f.read()
+            self.assertEqual(gif[:6], 'GIF89a')
+            self.assertEqual(gif[-1], ';')
+            self.assertEqual(gif.count('!\xf9\x04\x00\x1e\x00'), 2)
+        finally:
+            shutil.rmtree(directory)
+
+    def test_pool(self):
+        pool = frames.make_pool(self.renderer, 2)
+        try:
+            self.assertEqual(
+                list(frames.encode_frames(history, self.renderer, pool)),
+                list(frames.encode_frames(history, self.renderer)))
+        finally:
+            pool.close()
+            pool.join()
@@ -0,0 +1,46 @@
+import ast
+import pkg_resources
+import unittest
+from rgkit import game
+
+map_data = ast.literal_eval(
+    open(pkg_resources.resource_filename('rgkit', 'maps/default.py')).read())
+settings = game.init_settings(map_data)
+
+attack_code = '''
+import rg
+
+class Robot:
+    def act(self, game):
+        for loc in rg.locs_around(self.location, filter_out=['invalid']):
+            robot = game.robots.get(loc)
+            if robot is not None and robot.player_id != self.player_id:
+                return ['attack', loc]
+        return ['move', rg.toward(self.location, rg.CENTER_POINT)]
+'''
+
+
+def snapshot(state):
+    return (state.turn, sorted(
+        (loc, robot.hp, robot.player_id, robot.robot_id)
+        for loc, robot in state.robots.iteritems()))
+
+
+class TestKeyframes(unittest.TestCase):
+    def play(self, keyframe_every):
+        g = game.Game(game.Player(attack_code), game.Player(attack_code),
+                      seed=11, keyframe_every=keyframe_every)
+        g.run_all_turns()
+        return g
+
+    def test_states_match_full_storage(self):
+        full = self.play(None)
+        keyframed = self.play(7)
+
+        self.assertEqual(len(keyframed._states),
+                         settings.max_turns // 7 + 1)
+        for turn in range(settings.max_turns + 1) + [53, 52, 3]:
+            self.assertEqual(snapshot(keyframed.get_state(turn)),
+                             snapshot(full.get_state(turn)))
+        self.assertEqual(keyframed.get_scores(), full.get_scores())
+        self.assertTrue(len(keyframed._rebuilt) <= game.REBUILT_STATES)
@@ -0,0 +1,79 @@
+import ast
+import pkg_resources
+import os
+import shutil
+import StringIO
+import sys
+import tempfile
+import unittest
+from rgkit import game, rg
+
+map_data = ast.literal_eval(
+    open(pkg_resources.resource_filename('rgkit', 'maps/default.py')).read())
+settings = game.init_settings(map_data)
+
+
+class TestPaths(unittest.TestCase):
+    def setUp(self):
+        self._path_cache_dir = settings.path_cache_dir
+        settings.path_cache_dir = None
+
+    def tearDown(self):
+        settings.path_cache_dir = self._path_cache_dir
+
+    def test_path_dist(self):
+        self.assertEqual(rg.path_dist((9, 9), (9, 9)), 0)
+        self.assertEqual(rg.path_dist((9, 9), (9, 12)), 3)
+        self.assertEqual(rg.path_dist((9, 9), (12, 9)),
+                         rg.wdist((9, 9), (12, 9)))
+        # around the obstacle at (3, 2)
+        self.assertEqual(rg.wdist((3, 3), (5, 2)), 3)
+        self.assertEqual(rg.path_dist((3, 3), (5, 2)), 3)
+        self.assertEqual(rg.path_dist((5, 3), (5, 1)), None)
+
+    def test_not_walkable(self):
+        self.assertEqual(rg.path_dist((0, 0), (9, 9)), None)
+        self.assertEqual(rg.next_step((9, 9), (-1, 9)), None)
+
+    def test_next_step_follows_path(self):
+        for start, end in [((9, 9), (3, 4)), ((1, 7), (17, 11)),
+                           ((4, 3), (15, 15))]:
+            loc = start
+            steps = 0
+            while loc != end:
+                next_loc = rg.next_step(loc, end)
+                self.assertTrue(next_loc in rg.locs_around(
+                    loc, filter_out=['invalid', 'obstacle']))
+                loc = next_loc
+                steps += 1
+            self.assertEqual(steps, rg.path_dist(start, end))
+        self.assertEqual(rg.next_step((9, 9), (9, 9)), (9, 9))
+
+    def test_stored_on_disk(self):
+        cache_dir = tempfile.mkdtemp()
+        try:
+            table = rg.Topology(settings).paths(cache_dir)
+            self.assertEqual(os.listdir(cache_dir),
+                             [settings.topology.checksum + '.paths'])
+            stored = rg.Topology(settings).paths(cache_dir)
+            self.assertFalse(stored is table)
+            self.assertEqual(list(table.dist), list(stored.dist))
+            self.assertEqual(list(table.step), list(stored.step))
+        finally:
+            shutil.rmtree(cache_dir)
+
+    def test_store_fails(self):
+        cache_dir = tempfile.mkdtemp()
+        sys.stderr = StringIO.StringIO()
+        try:
+            # a file where the directory should be
+            blocked = os.path.join(cache_dir, 'file')
+            open(blocked, 'w').close()
+            topology = rg.Topology(settings)
+            table = topology.paths(os.path.join(blocked, 'paths'))
+            self.assertTrue(topology.paths(None) is table)
+            self.assertEqual(os.listdir(cache_dir), ['file'])
+            self.assertTrue('could not store' in sys.stderr.getvalue())
+        finally:
+            sys.stderr = sys.__stderr__
+            shutil.rmtree(cache_dir)
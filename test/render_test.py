@@ -0,0 +1,54 @@
+import itertools
+import unittest
+from rgkit.render import render
+
+
+class StackingCanvas(object):
+    '''Keeps the stacking order of its items, bottom first.'''
+
+    def __init__(self):
+        self._ids = itertools.count(1)
+        self.stack = []
+        self.tags = {}
+
+    def _create(self, coords, tags=(), **kargs):
+        item = next(self._ids)
+        self.stack.append(item)
+        self.tags[item] = set(tags)
+        return item
+
+    create_rectangle = create_oval = create_line = create_text = _create
+
+    def coords(self, item, coords):
+        pass
+
+    def itemconfig(self, item, tags=None, **kargs):
+        if tags is not None:
+            self.tags[item] = set(tags)
+
+    def delete(self, item):
+        self.stack.remove(item)
+
+    def tag_raise(self, tag):
+        raised = [item for item in self.stack
+                  if item == tag or tag in self.tags[item]]
+        self.stack = [item for item in self.stack if item not in raised]
+        self.stack.extend(raised)
+
+
+class TestRender(unittest.TestCase):
+    def setUp(self):
+        self.render = render.Render.__new__(render.Render)
+        self.render._win = StackingCanvas()
+        self.render._item_pool = {}
+        self.render._item_types = {}
+
+    def test_reused_item_is_on_top(self):
+        old = self.render.create_item('rectangle', (0, 0, 10, 10))
+        robot = self.render.create_item('rectangle', (0, 0, 10, 10))
+        self.render.remove_object(old)
+
+        # a highlight drawn after the robot covers it, as a new item would
+        highlight = self.render.create_item('rectangle', (0, 0, 10, 10))
+        self.assertEqual(highlight, old)
+        self.assertEqual(self.render._win.stack, [robot, highlight])
@@ -0,0 +1,139 @@
+import ast
+import json
+import os
+import pkg_resources
+import struct
+import tempfile
+import unittest
+from rgkit import game, replay
+
+map_data = ast.literal_eval(
+    open(pkg_resources.resource_filename('rgkit', 'maps/default.py')).read())
+settings = game.init_settings(map_data)
+
+attacker_code = '''
+import rg
+
+
+class Robot:
+    def act(self, game):
+        for loc in rg.locs_around(self.location):
+            robot = game.robots.get(loc)
+            if robot and robot.player_id != self.player_id:
+                return ['attack', loc]
+        if self.hp < 10:
+            return ['suicide']
+        return ['move', rg.toward(self.location, rg.CENTER_POINT)]
+'''
+
+
+class TestReplay(unittest.TestCase):
+    def setUp(self):
+        fd, self.fname = tempfile.mkstemp()
+        os.close(fd)
+
+    def tearDown(self):
+        os.remove(self.fname)
+
+    def test_roundtrip(self):
+        guard_code = open(pkg_resources.resource_filename(
+            'rgkit', 'bots/guardbot.py')).read()
+        g = game.Game(game.Player(attacker_code), game.Player(guard_code),
+                      record_history=True, seed=3)
+        g.run_all_turns()
+
+        replay.write_replay(self.fname, g.history)
+        reader = replay.ReplayReader(self.fname)
+
+        self.assertEqual(len(reader), len(g.history))
+        for turn in reversed(xrange(len(g.history))):
+            self.assertEqual(reader[turn], g.history[turn])
+        self.assertEqual(reader[-1], g.history[-1])
+        self.assertEqual(list(reader), g.history)
+        self.assertRaises(IndexError, lambda: reader[len(g.history)])
+        reader.close()
+
+    def test_wide_fields(self):
+        robots = [{'location': (9, 9), 'hp': 1000, 'player_id': 1,
+                   'robot_id': 100000, 'action': ['guard']}]
+        replay.write_replay(self.fname, [robots])
+        reader = replay.ReplayReader(self.fname)
+        self.assertEqual(reader[0], robots)
+        reader.close()
+
+    def test_version_1(self):
+        robot = struct.pack('<HBBBBB', 7, 9, 9, 50, 1, 0x10)
+        with open(self.fname, 'wb') as f:
+            f.write(struct.pack('<4sHII', 'RGRP', 1, 1, 14 + len(robot)))
+            f.write(robot)
+            f.write(struct.pack('<II', 14, 14 + len(robot)))
+
+        reader = replay.ReplayReader(self.fname)
+        self.assertEqual(list(reader), [[{'location': (9, 9), 'hp': 50,
+                                          'player_id': 1, 'robot_id': 7,
+                                          'action': ['guard']}]])
+        reader.close()
+
+    def test_not_a_replay(self):
+        with open(self.fname, 'wb') as f:
+            f.write('x' * 100)
+        self.assertRaises(ValueError, replay.ReplayReader, self.fname)
+
+    def play(self, history_sink, record_actions=False):
+        guard_code = open(pkg_resources.resource_filename(
+            'rgkit', 'bots/guardbot.py')).read()
+        g = game.Game(game.Player(attacker_code), game.Player(guard_code),
+                      record_history=True, seed=5, history_sink=history_sink,
+                      record_actions=record_actions)
+        g.run_all_turns()
+        return g
+
+    def test_binary_sink(self):
+        with open(self.fname, 'wb') as f:
+            writer = replay.ReplayWriter(f, buffer_size=1000)
+            g = self.play(writer)
+            writer.close()
+
+        reader = replay.ReplayReader(self.fname)
+        self.assertEqual(list(reader), g.history)
+        reader.close()
+
+    def test_json_lines_sink(self):
+        with open(self.fname, 'w') as f:
+            writer = replay.JsonLinesWriter(f, buffer_size=1000)
+            g = self.play(writer)
+            writer.close()
+
+        with open(self.fname) as f:
+            lines = [json.loads(line) for line in f]
+        self.assertEqual(lines, json.loads(json.dumps(g.history)))
+
+    def test_actions(self):
+        expected = self.play(None, record_actions=True)
+
+        actions_fd, actions_fname = tempfile.mkstemp()
+        try:
+            with open(self.fname, 'wb') as f:
+                with os.fdopen(actions_fd, 'w') as actions_f:
+                    writer = replay.ReplayWriter(f, buffer_size=1000,
+                                                 actions_f=actions_f)
+                    g = self.play(writer, record_actions=True)
+                    writer.close()
+
+            # only the latest turns stay in memory
+            self.assertEqual(g._states.keys(), [settings.max_turns])
+            self.assertEqual(g._actions_on_turn.keys(), [settings.max_turns])
+            self.assertEqual(g.get_scores(), expected.get_scores())
+
+            with open(actions_fname) as f:
+                lines = [json.loads(line) for line in f]
+        finally:
+            os.remove(actions_fname)
+
+        self.assertEqual(len(lines), settings.max_turns + 1)
+        for turn, line in enumerate(lines):
+            actions_on_turn = expected.get_actions_on_turn(turn)
+            self.assertEqual(
+                line,
+                json.loads(json.dumps([actions_on_turn[loc]
+                                       for loc in sorted(actions_on_turn)])))
@@ -0,0 +1,114 @@
+import ast
+import pkg_resources
+import shutil
+import tempfile
+import unittest
+from rgkit import game, run
+from rgkit.resultcache import ResultCache, settings_checksum
+from rgkit.settings import AttrDict
+
+map_data = ast.literal_eval(
+    open(pkg_resources.resource_filename('rgkit', 'maps/default.py')).read())
+settings = game.init_settings(map_data)
+
+
+class TestResultCache(unittest.TestCase):
+    def setUp(self):
+        self.path = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.path)
+
+    def test_roundtrip(self):
+        cache = ResultCache(self.path, 'map')
+        self.assertEqual(cache.get('bot1', 'bot2', '1-0'), None)
+
+        cache.put('bot1', 'bot2', '1-0', [3, 4], history=[[{'hp': 50}]])
+        result = cache.get('bot1', 'bot2', '1-0')
+        self.assertEqual(result['scores'], [3, 4])
+        self.assertEqual(result['history'], [[{'hp': 50}]])
+
+        cache.put('bot1', 'bot2', '1-0', [3, 4])
+        self.assertEqual(cache.get('bot1', 'bot2', '1-0')['history'], None)
+
+    def test_key(self):
+        cache = ResultCache(self.path, 'map', version='1')
+        cache.put('bot1', 'bot2', '1-0', [3, 4])
+
+        self.assertEqual(cache.get('bot1', 'bot2', '1-1'), None)
+        self.assertEqual(cache.get('bot2', 'bot1', '1-0'), None)
+        self.assertEqual(cache.get('bot1', 'bot3', '1-0'), None)
+        self.assertEqual(
+            ResultCache(self.path, 'map2', version='1').get(
+                'bot1', 'bot2', '1-0'),
+            None)
+        self.assertEqual(
+            ResultCache(self.path, 'map', version='2').get(
+                'bot1', 'bot2', '1-0'),
+            None)
+        self.assertEqual(
+            ResultCache(self.path, 'map', version='1').get(
+                'bot1', 'bot2', '1-0')['scores'],
+            [3, 4])
+
+    def test_settings_key(self):
+        cache = ResultCache(self.path, 'map', version='1')
+        cache.put('bot1', 'bot2', '1-0', [3, 4])
+
+        changed = AttrDict(settings)
+        changed.robot_hp += 1
+        self.assertEqual(
+            ResultCache(self.path, 'map', version='1',
+                        settings=changed).get('bot1', 'bot2', '1-0'),
+            None)
+        changed = AttrDict(settings)
+        changed.max_usercode_time = 10
+        self.assertEqual(
+            ResultCache(self.path, 'map', version='1',
+                        settings=changed).get('bot1', 'bot2', '1-0'),
+            None)
+        changed = AttrDict(settings)
+        changed.FPS = 1
+        self.assertEqual(
+            ResultCache(self.path, 'map', version='1',
+                        settings=changed).get('bot1', 'bot2', '1-0')['scores'],
+            [3, 4])
+
+    def test_settings_checksum(self):
+        map_settings = game.init_settings(map_data)
+        checksum = settings_checksum(map_settings)
+        self.assertEqual(settings_checksum(map_settings), checksum)
+
+        # the bundled maps hold their locations in sets
+        as_sets = AttrDict(map_settings)
+        for name in ('spawn_coords', 'obstacles'):
+            as_sets[name] = set(tuple(loc) for loc in map_settings[name])
+        self.assertEqual(settings_checksum(as_sets), checksum)
+
+        reordered = AttrDict(map_settings)
+        reordered.spawn_coords = list(reversed(map_settings.spawn_coords))
+        self.assertEqual(settings_checksum(reordered), checksum)
+
+        moved = AttrDict(map_settings)
+        moved.obstacles = list(map_settings.obstacles)[1:]
+        self.assertNotEqual(settings_checksum(moved), checksum)
+
+    def test_rendered_games_skip_cache(self):
+        args = run.parser.parse_args(['bot1', 'bot2', '--cache', self.path])
+        self.assertEqual(run.make_cache(args), None)
+        args = run.parser.parse_args(['bot1', 'bot2', '--cache', self.path,
+                                      '-H'])
+        self.assertTrue(isinstance(run.make_cache(args), ResultCache))
+
+    def test_match_pool(self):
+        cache = ResultCache(self.path, 'map')
+        code = run.read_bot('bots/guardbot.py')
+        cache.put(code, code, 'cached', [-1, -1])
+
+        with run.MatchPool(2) as pool:
+            scores = pool.map('bots/guardbot.py', 'bots/guardbot.py',
+                              ['cached', 'played'], quiet=3, cache=cache)
+
+        self.assertEqual(scores[0], [-1, -1])
+        self.assertEqual(cache.get(code, code, 'played')['scores'],
+                         scores[1])
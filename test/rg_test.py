@@ -2,6 +2,7 @@ import ast
 import pkg_resources
 import unittest
 from rgkit import game, rg
+from rgkit.settings import AttrDict
 
 map_data = ast.literal_eval(
     open(pkg_resources.resource_filename('rgkit', 'maps/default.py')).read())
@@ -37,3 +38,75 @@ class TestRG(unittest.TestCase):
 
     def test_toward_obstacle(self):
         self.assertEqual(rg.toward((5, 2), (4, 3)), (5, 3))
+
+    def test_around_invalid_and_obstacle(self):
+        self.assertEqual(
+            rg.locs_around((1, 7), filter_out=['invalid', 'obstacle']),
+            [(1, 8), (2, 7)])
+
+    def test_around_off_board(self):
+        self.assertEqual(rg.locs_around((-1, 9), filter_out=['invalid']),
+                         [(0, 9)])
+
+    def test_topology(self):
+        topology = settings.topology
+        self.assertEqual(topology.cell_type((3, 4)), rg.NORMAL | rg.SPAWN)
+        self.assertEqual(topology.cell_type((19, 4)), rg.INVALID)
+        for loc in topology.types:
+            for mask in xrange(rg.INVALID * 2):
+                names = [name for name, bit in rg.TYPE_BITS.iteritems()
+                         if mask & bit]
+                self.assertEqual(
+                    list(topology.locs_around(loc, mask)),
+                    [a_loc for a_loc in rg._locs_around(loc)
+                     if not set(names) & rg.loc_types(a_loc)])
+
+    def test_memoize_per_map(self):
+        @rg.memoize
+        def is_obstacle(loc):
+            return 'obstacle' in rg.loc_types(loc)
+
+        self.assertTrue(is_obstacle((0, 0)))
+        self.assertTrue(is_obstacle((0, 0)))
+        self.assertEqual(is_obstacle.__self__.misses, 1)
+
+        open_map = AttrDict(settings)
+        open_map.obstacles = []
+        open_map.topology = rg.get_topology(open_map)
+        self.assertNotEqual(open_map.topology.checksum,
+                            settings.topology.checksum)
+        rg.set_settings(open_map)
+        try:
+            self.assertFalse(is_obstacle((0, 0)))
+        finally:
+            rg.set_settings(settings)
+        # the entries of the first map were kept aside
+        self.assertTrue(is_obstacle((0, 0)))
+        self.assertEqual(is_obstacle.__self__.stats(),
+                         {'misses': 2, 'entries': 1, 'maps': 2,
+                          'size': rg.MEMOIZE_MAPS})
+
+    def test_memoize_evicts_maps(self):
+        memo = rg.MemoDict(lambda arg: arg * 2, 2)
+        for checksum in ('a', 'b', 'a', 'c'):
+            memo.switch(checksum)
+            memo[checksum]
+        # b was used least recently
+        self.assertEqual(memo.stats()['maps'], 2)
+        memo.switch('a')
+        self.assertEqual(memo.keys(), ['a'])
+        memo.switch('b')
+        self.assertEqual(memo.keys(), [])
+
+    def test_bounded_cache(self):
+        cache = rg.BoundedCache(3)
+        for i in xrange(10):
+            self.assertEqual(cache.get(i, lambda: i * 2), i * 2)
+            self.assertEqual(cache.get(0, lambda: 0), 0)
+        self.assertEqual(len(cache), 3)
+        # 0 is used all the time, so it is never evicted
+        self.assertEqual(cache.misses, 10)
+        self.assertEqual(cache.hits, 10)
+
+    def test_topology_reused(self):
+        self.assertTrue(rg.get_topology(settings) is settings.topology)
@@ -0,0 +1,94 @@
+import ast
+import os
+import pkg_resources
+import tempfile
+import unittest
+from rgkit import game, run
+
+map_data = ast.literal_eval(
+    open(pkg_resources.resource_filename('rgkit', 'maps/default.py')).read())
+settings = game.init_settings(map_data)
+
+
+class TestRun(unittest.TestCase):
+    def test_worker_player_compiles_once(self):
+        code = run.read_bot('bots/guardbot.py')
+        player = run.worker_player(code, 0)
+        robot = player._robot
+        module = player._module
+
+        again = run.worker_player(code, 0)
+        self.assertTrue(again is player)
+        self.assertTrue(again._module is module)
+        self.assertFalse(again._robot is robot)
+
+        self.assertFalse(run.worker_player(code, 1) is player)
+
+    def test_match_pool(self):
+        seeds = ['7-%d' % i for i in xrange(6)]
+        expected = [run.play([run.make_player('bots/guardbot.py'),
+                              run.make_player('bots/randombot.py')],
+                             print_info=False, match_seed=seed, quiet=3)
+                    for seed in seeds]
+        run.unmute_all()
+
+        with run.MatchPool(2) as pool:
+            scores = pool.map('bots/guardbot.py', 'bots/randombot.py', seeds,
+                              batch_size=4, quiet=3)
+
+        self.assertEqual(scores, expected)
+
+    def test_match_pool_unordered(self):
+        seeds = ['7-%d' % i for i in xrange(5)]
+        with run.MatchPool(2) as pool:
+            ordered = pool.map('bots/guardbot.py', 'bots/guardbot.py', seeds,
+                               quiet=3)
+            unordered = dict(pool.imap_unordered(
+                'bots/guardbot.py', 'bots/guardbot.py', seeds, quiet=3))
+
+        self.assertEqual([unordered[seed] for seed in seeds], ordered)
+
+    def test_match_pool_terminate(self):
+        seeds = ['7-%d' % i for i in xrange(40)]
+        with run.MatchPool(2) as pool:
+            results = pool.imap_unordered(
+                'bots/guardbot.py', 'bots/guardbot.py', seeds, quiet=3)
+            next(results)
+            results.close()
+            pool.terminate()
+
+    def test_match_pool_error(self):
+        fd, fname = tempfile.mkstemp(suffix='.py')
+        with os.fdopen(fd, 'w') as f:
+            f.write('class Robot:\n    def act(self, game)\n')
+        try:
+            with run.MatchPool(2) as pool:
+                results = pool.imap_unordered(fname, fname, ['7-0'], quiet=3)
+                self.assertRaises(SyntaxError, list, results)
+        finally:
+            os.remove(fname)
+
+    def test_profile(self):
+        phases = set(game.PROFILE_PHASES) - set(['rendering'])
+        profile = game.Profile()
+        run.play([run.make_player('bots/guardbot.py'),
+                  run.make_player('bots/guardbot.py')],
+                 print_info=False, match_seed='7-0', quiet=3,
+                 profile=profile)
+        run.unmute_all()
+        self.assertEqual(set(profile), phases)
+        self.assertTrue(profile['get_delta'] > 0)
+
+        pooled = game.Profile()
+        with run.MatchPool(2) as pool:
+            pool.map('bots/guardbot.py', 'bots/guardbot.py',
+                     ['7-%d' % i for i in xrange(3)], batch_size=1,
+                     quiet=3, profile=pooled)
+        self.assertEqual(set(pooled), phases)
+
+    def test_sprt(self):
+        self.assertEqual(run.sprt([]), None)
+        self.assertEqual(run.sprt([[5, 3]] * 3 + [[4, 4]] * 20), None)
+        self.assertEqual(run.sprt([[5, 3]] * 8), 1)
+        self.assertEqual(run.sprt([[0, 3]] * 8), 2)
+        self.assertEqual(run.sprt([[5, 3], [3, 5]] * 50), None)
@@ -0,0 +1,115 @@
+import ast
+import gc
+import pkg_resources
+import types
+import unittest
+from rgkit import game
+from rgkit.arraystate import ArrayGameState
+from rgkit.gamestate import GameState
+
+map_data = ast.literal_eval(
+    open(pkg_resources.resource_filename('rgkit', 'maps/default.py')).read())
+settings = game.init_settings(map_data)
+
+
+class TestSimulate(unittest.TestCase):
+    def make_states(self):
+        for state_cls in (GameState, ArrayGameState):
+            state = state_cls(settings, turn=1)
+            state.add_robot((9, 9), 0)
+            state.add_robot((9, 10), 1)
+            state.add_robot((11, 9), 0)
+            state.add_robot((12, 9), 1)
+            yield state
+
+    def test_state_not_exposed(self):
+        for state in self.make_states():
+            simulate = state.get_game_info(0).simulate
+
+            # everything simulate holds on to, following the closures and
+            # defaults of functions but not their globals
+            seen = set()
+            todo = [simulate]
+            while todo:
+                obj = todo.pop()
+                if id(obj) in seen or isinstance(obj,
+                                                 (types.ModuleType, type)):
+                    continue
+                seen.add(id(obj))
+                self.assertFalse(isinstance(obj, GameState))
+                self.assertFalse(obj is state.robots)
+                if isinstance(obj, types.FunctionType):
+                    todo.extend(cell.cell_contents
+                                for cell in obj.func_closure or ())
+                    todo.extend(obj.func_defaults or ())
+                else:
+                    todo.extend(gc.get_referents(obj))
+            for name in ('__self__', 'im_self', '__closure__'):
+                self.assertEqual(getattr(simulate, name, None), None)
+
+    def test_expected_damage(self):
+        for state in self.make_states():
+            game_info = state.get_game_info(0)
+            predicted = game_info.simulate({(9, 9): ['attack', (9, 10)]})
+
+            self.assertEqual(predicted.turn, 2)
+            # (9, 10) has no action, so it guards
+            self.assertEqual(predicted.robots[9, 10].hp,
+                             settings.robot_hp - 9 / 2.0)
+            self.assertEqual(predicted.robots[9, 9].hp, settings.robot_hp)
+            # the real state is untouched
+            self.assertEqual(state.robots[9, 10].hp, settings.robot_hp)
+            self.assertEqual(state.turn, 1)
+
+    def test_worst_damage(self):
+        for state in self.make_states():
+            predicted = state.get_game_info(0).simulate(
+                {(9, 9): ['attack', (9, 10)]},
+                enemy_policy={(9, 10): ['attack', (9, 9)]},
+                damage='worst')
+            low, high = settings.attack_range
+            self.assertEqual(predicted.robots[9, 10].hp,
+                             settings.robot_hp - low)
+            self.assertEqual(predicted.robots[9, 9].hp,
+                             settings.robot_hp - high)
+
+    def test_enemy_policy_function(self):
+        def charge(game_info):
+            return dict((loc, ['move', (loc[0] - 1, loc[1])])
+                        for loc, robot in game_info.robots.iteritems()
+                        if robot.player_id == 1)
+
+        for state in self.make_states():
+            predicted = state.get_game_info(0).simulate(
+                {(11, 9): ['guard']}, enemy_policy=charge)
+            # (12, 9) bumps into the guarding (11, 9)
+            self.assertEqual(predicted.robots[12, 9].hp,
+                             settings.robot_hp - settings.collision_damage)
+            self.assertEqual(predicted.robots[11, 9].hp, settings.robot_hp)
+            self.assertTrue((8, 10) in predicted.robots)
+            self.assertRaises(AttributeError,
+                              lambda: predicted.robots[8, 10].robot_id)
+
+    def test_suicide_and_spawn_clearing(self):
+        for state in self.make_states():
+            state.turn = 10
+            state.add_robot((3, 4), 1)
+            predicted = state.get_game_info(0).simulate(
+                {(9, 9): ['suicide'], (11, 9): ['move', (10, 9)]},
+                enemy_policy={(3, 4): ['guard']})
+            self.assertFalse((9, 9) in predicted.robots)
+            self.assertFalse((3, 4) in predicted.robots)
+            self.assertEqual(predicted.robots[9, 10].hp,
+                             settings.robot_hp - settings.suicide_damage / 2)
+            # no damage to its own side
+            self.assertEqual(predicted.robots[10, 9].hp, settings.robot_hp)
+            # nothing spawns in a prediction
+            self.assertEqual(len(predicted.robots), 3)
+
+    def test_invalid_action_guards(self):
+        for state in self.make_states():
+            predicted = state.get_game_info(1).simulate(
+                {(9, 10): ['move', (0, 0)]},
+                enemy_policy={(9, 9): ['attack', (9, 10)]})
+            self.assertEqual(predicted.robots[9, 10].hp,
+                             settings.robot_hp - 9 / 2.0)
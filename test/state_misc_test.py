@@ -1,7 +1,10 @@
 import ast
+import copy
+import pickle
 import pkg_resources
 import unittest
 from rgkit import game
+from rgkit.arraystate import ArrayGameState
 from rgkit.gamestate import GameState
 
 map_data = ast.literal_eval(
@@ -62,3 +65,53 @@ class TestStateMisc(unittest.TestCase):
         self.assertRaises(AttributeError,
                           lambda: game_info.robots[6, 11].robot_id)
         self.assertEquals(game_info.turn, state.turn)
+
+    def test_game_info_is_read_only_copy(self):
+        for state_cls in (GameState, ArrayGameState):
+            state = state_cls(settings)
+            state.add_robot((9, 9), 0)
+            state.add_robot((6, 11), 1)
+            game_info = state.get_game_info(0)
+
+            mine = game_info.robots[9, 9]
+            enemy = game_info.robots[6, 11]
+            self.assertEquals(mine['robot_id'], state.robots[9, 9].robot_id)
+            self.assertEquals(mine, state.robots[9, 9])
+            self.assertFalse('robot_id' in enemy)
+            self.assertRaises(KeyError, lambda: enemy['robot_id'])
+            self.assertEquals(sorted(enemy.keys()),
+                              ['hp', 'location', 'player_id'])
+            self.assertEquals(set(game_info.robots), set([(9, 9), (6, 11)]))
+            self.assertEquals(game_info.robots.get((1, 1)), None)
+
+            def write():
+                mine.hp = 1
+            self.assertRaises(AttributeError, write)
+
+            def write_item():
+                mine['hp'] = 1
+            self.assertRaises(TypeError, write_item)
+            self.assertRaises(TypeError, mine.update, hp=1)
+
+            # nothing in game_info leads back to the state
+            game_info.robots[9, 9] = None
+            self.assertEquals(state.robots[9, 9].hp, settings.robot_hp)
+            state.robots[6, 11].hp = 7
+            self.assertEquals(enemy.hp, settings.robot_hp)
+
+    def test_game_info_copies(self):
+        state = GameState(settings)
+        state.add_robot((9, 9), 0)
+        state.add_robot((6, 11), 1)
+        robots = state.get_game_info(0).robots
+
+        for copied in (copy.deepcopy(robots[9, 9]),
+                       pickle.loads(pickle.dumps(robots[9, 9])),
+                       pickle.loads(pickle.dumps(robots[9, 9], 2))):
+            self.assertEquals(copied, robots[9, 9])
+            self.assertEquals(copied.robot_id, state.robots[9, 9].robot_id)
+        enemy = pickle.loads(pickle.dumps(robots[6, 11], 2))
+        self.assertFalse('robot_id' in enemy)
+
+        self.assertEquals(copy.deepcopy(robots), robots)
+        self.assertEquals(pickle.loads(pickle.dumps(robots)), robots)
@@ -0,0 +1,96 @@
+import ast
+import pkg_resources
+import unittest
+from rgkit import game
+from rgkit.gamestate import GameState
+
+map_data = ast.literal_eval(
+    open(pkg_resources.resource_filename('rgkit', 'maps/default.py')).read())
+settings = game.init_settings(map_data)
+
+quick_code = '''
+class Robot:
+    def act(self, game):
+        return ['suicide']
+'''
+
+looping_code = '''
+class Robot:
+    def act(self, game):
+        while True:
+            pass
+'''
+
+swallowing_code = '''
+class Robot:
+    def act(self, game):
+        try:
+            while True:
+                pass
+        except:
+            pass
+        while True:
+            pass
+'''
+
+
+class TestTiming(unittest.TestCase):
+    def setUp(self):
+        self._max_usercode_time = settings.max_usercode_time
+
+    def tearDown(self):
+        settings.max_usercode_time = self._max_usercode_time
+
+    def make_state(self):
+        state = GameState(settings)
+        state.add_robot((9, 9), 0)
+        state.add_robot((5, 5), 0)
+        state.add_robot((12, 12), 1)
+        return state
+
+    def test_timings_are_recorded(self):
+        player = game.Player(quick_code)
+        player.set_player_id(0)
+        state = self.make_state()
+        actions = player.get_actions(state, 0)
+
+        self.assertEqual(actions, {(9, 9): ['suicide'],
+                                   (5, 5): ['suicide']})
+        self.assertEqual(sorted((turn, robot_id)
+                                for turn, robot_id, _ in player.timings),
+                         [(0, 0), (0, 1)])
+        stats = player.get_timing_stats()
+        self.assertEqual(stats.calls, 2)
+        self.assertEqual(stats.timeouts, 0)
+        self.assertTrue(0 <= stats.mean <= stats.p95 <= stats.max)
+
+        player.reset()
+        self.assertEqual(player.timings, [])
+
+    def test_looping_bot_is_stopped(self):
+        settings.max_usercode_time = 50
+        player = game.Player(looping_code)
+        player.set_player_id(0)
+        state = self.make_state()
+        actions = player.get_actions(state, 0)
+
+        # the first robot uses up the whole budget of the turn
+        self.assertEqual(actions, {(9, 9): ['guard'], (5, 5): ['guard']})
+        self.assertEqual(player.timeouts, 2)
+        self.assertTrue(player.get_timing_stats().max >= 50)
+
+    def test_swallowing_bot_is_stopped(self):
+        settings.max_usercode_time = 50
+        player = game.Player(swallowing_code)
+        player.set_player_id(0)
+        actions = player.get_actions(self.make_state(), 0)
+
+        self.assertEqual(actions, {(9, 9): ['guard'], (5, 5): ['guard']})
+        self.assertEqual(player.timeouts, 2)
+
+    def test_no_limit(self):
+        settings.max_usercode_time = None
+        player = game.Player(quick_code)
+        player.set_player_id(1)
+        actions = player.get_actions(self.make_state(), 0)
+        self.assertEqual(actions, {(12, 12): ['suicide']})
@@ -0,0 +1,62 @@
+import ast
+import json
+import pkg_resources
+import StringIO
+import unittest
+from rgkit import game
+from rgkit.tracing import Tracer
+
+map_data = ast.literal_eval(
+    open(pkg_resources.resource_filename('rgkit', 'maps/default.py')).read())
+settings = game.init_settings(map_data)
+
+guard_code = '''
+class Robot:
+    def act(self, game):
+        return ['guard']
+'''
+
+
+class TestTracing(unittest.TestCase):
+    def setUp(self):
+        self.tracer = Tracer()
+        self.game = game.Game(game.Player(guard_code),
+                              game.Player(guard_code),
+                              seed=3, tracer=self.tracer)
+        self.game.run_all_turns()
+
+    def test_spans_are_nested(self):
+        stack = []
+        for event in self.tracer.events:
+            if event['ph'] == 'B':
+                stack.append(event)
+            else:
+                self.assertEqual(event['ph'], 'E')
+                begin = stack.pop()
+                self.assertEqual(begin['name'], event['name'])
+                self.assertTrue(begin['ts'] <= event['ts'])
+        self.assertEqual(stack, [])
+
+    def test_events(self):
+        begins = [event for event in self.tracer.events
+                  if event['ph'] == 'B']
+        names = [event['name'] for event in begins]
+        self.assertEqual(names.count('game'), 1)
+        self.assertEqual(names.count('turn'), settings.max_turns)
+        self.assertEqual(names.count('get_actions'), settings.max_turns * 2)
+        for phase in ('get_delta', 'apply_delta'):
+            self.assertEqual(names.count(phase), settings.max_turns)
+
+        acts = [event['args'] for event in begins if event['name'] == 'act']
+        robots = sum(len(self.game.get_state(turn).robots)
+                     for turn in xrange(settings.max_turns))
+        self.assertEqual(len(acts), robots)
+        self.assertEqual(acts[0]['turn'], 1)
+        self.assertTrue(acts[0]['player'] in (0, 1))
+        self.assertEqual(sorted(acts[0]), ['player', 'robot_id', 'turn'])
+
+    def test_write(self):
+        f = StringIO.StringIO()
+        self.tracer.write(f)
+        self.assertEqual(json.loads(f.getvalue())['traceEvents'],
+                         self.tracer.events)